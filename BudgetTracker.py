@@ -1,25 +1,603 @@
+import time
+# Taken before the Qt imports so the startup report includes them
+STARTUP_STARTED = time.perf_counter()
+
+import os
 import sys
-from turtle import pd
-from PyQt5.QtSql import QSqlDatabase, QSqlQuery
+import bisect
+import math
+from contextlib import contextmanager
 from datetime import datetime
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QTabWidget, QWidget, QGridLayout, QDateEdit, QComboBox, QLineEdit, QPushButton, QTableWidget, QTableWidgetItem, QAction, QFileDialog)
-from PyQt5.QtCore import QDate
-#import pandas as pd
-#from sqlalchemy import create_engine
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QTabWidget, QWidget, QGridLayout, QDateEdit, QComboBox, QLineEdit, QPushButton, QTableWidget, QTableWidgetItem, QTableView, QHeaderView, QAction, QFileDialog, QLabel, QDialog, QListWidget)
+from PyQt5.QtGui import QColor, QPainter, QPen
+from PyQt5.QtCore import QDate, Qt, QAbstractTableModel, QModelIndex, QTimer, pyqtSignal
+from ledger import Ledger, DEFAULT_DB_PATH, TRANSACTION_SORT_COLUMNS, TRANSACTION_SORT_KEYS, format_month_label
+from query_executor import QueryExecutor
+from budgets import BudgetMonitor, parse_amount
+from query_stats import query_stats, latency_bucket_labels, SLOW_QUERY_THRESHOLD_MS, SLOW_QUERY_LOG_PATH
+
+# Qt equivalents of the ledger's ISO storage format and the date picker's display format
+QT_DB_DATE_FORMAT = 'yyyy-MM-dd'
+QT_DISPLAY_DATE_FORMAT = 'dd-MMM-yy'
+
+ALL_CATEGORIES = "All Categories"
+
+# Balance history bucket choices, as (combo label, ledger bucket)
+BALANCE_HISTORY_BUCKETS = [("Weekly", "week"), ("Monthly", "month"), ("Yearly", "year")]
+# Line colours for the accounts in the balance history chart
+CHART_COLORS = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b"]
+# Column mapping and category rules for bank statement imports, used when the file exists (see bank_csv.py)
+BANK_CSV_MAPPING_PATH = 'bank_csv_mapping.json'
+# Budget status text colours, by BudgetMonitor state
+BUDGET_STATE_COLORS = {'warning': "#ff7f0e", 'over': "#d62728"}
+# How often to check whether another connection, e.g. budget_service.py, has written to the database
+DATA_VERSION_POLL_MS = 2000
+# Memo searches start once typing pauses for this long
+SEARCH_DELAY_MS = 250
+# How long status bar messages stay up
+STATUS_MESSAGE_MS = 10000
+# Analytics table columns, as (header, category_summary key)
+ANALYTICS_COLUMNS = [
+    ("Category", 'category'), ("This Month", 'month_to_date'), ("Forecast", 'forecast'),
+    ("3-Month Avg", 'average_3'), ("12-Month Avg", 'average_12'), ("Last 12 Months", 'last_12'),
+    ("YoY Change", 'yoy_delta'), ("YoY %", 'yoy_percent'),
+]
+
+IMPORTS_FINISHED = time.perf_counter()
+
+
+def add_and_fetch_transaction(ledger, date, category, amount, memo=None):
+    # Worker-side insert that hands back the stored (id, date, category, amount, memo) row
+    return ledger.get_transaction(ledger.add_transaction(date, category, amount, memo))
+
+
+def import_bank_statement(ledger, file_name):
+    # Worker-side bank CSV import; returns (inserted, skipped, seconds taken)
+    from bank_csv import load_mapping
+    mapping = load_mapping(BANK_CSV_MAPPING_PATH if os.path.exists(BANK_CSV_MAPPING_PATH) else None)
+    return ledger.import_bank_csv(file_name, mapping)
+
+
+def search_memos(ledger, text):
+    # Worker-side memo search; returns (rows, match count, total, seconds taken)
+    started = time.perf_counter()
+    rows, count, total = ledger.search_transactions(text)
+    return rows, count, total, time.perf_counter() - started
+
+
+def verify_and_rebuild_monthly_totals(ledger):
+    # Worker-side totals check; rebuilds on drift and returns the number of mismatched rows found
+    mismatches = ledger.verify_monthly_totals()
+    if mismatches:
+        ledger.rebuild_monthly_totals()
+    return mismatches
+
+
+def load_transaction_columns(ledger):
+    # Worker-side load of the Analytics cache; numpy is only imported once the tab is used
+    from analytics import TransactionColumns
+    return TransactionColumns.load(ledger)
+
+
+def read_transaction_rows(ledger, after_id):
+    # Worker-side read of the (id, date, category, amount) rows added after after_id
+    return list(ledger.iter_transaction_rows(after_id))
+
+
+def format_display_date(iso_date):
+    # Show stored ISO dates in the same format as the date picker
+    display_date = QDate.fromString(iso_date, QT_DB_DATE_FORMAT)
+    return display_date.toString(QT_DISPLAY_DATE_FORMAT) if display_date.isValid() else iso_date
+
+
+class TransactionTableModel(QAbstractTableModel):
+    # Lazily paged view over the whole transactions table.
+    # Rows are fetched a page at a time with keyset pagination on (sort key, id),
+    # so scrolling deep into the history never re-reads or OFFSETs over earlier rows.
+    # Pages are read on a worker thread and appended when they arrive.
+    PAGE_SIZE = 200
+    COLUMNS = [("Date", "date"), ("Category", "category"), ("Amount", "amount"), ("Memo", "memo")]
+
+    def __init__(self, executor, parent=None):
+        super().__init__(parent)
+        self.executor = executor
+        self.request_key = f"transaction-page-{id(self)}"
+        self.rows = []  # (id, date, category, amount, memo)
+        self.sort_column = 0
+        self.sort_order = Qt.DescendingOrder
+        self.category_filter = None
+        self.exhausted = False
+        self.loading = False
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section][0]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        _, date, category, amount, memo = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            return [format_display_date(date), category, str(amount), memo or ""][index.column()]
+        if role == Qt.TextAlignmentRole and index.column() == 2:
+            return Qt.AlignRight | Qt.AlignVCenter
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted and not self.loading
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.exhausted or self.loading:
+            return
+        # Ask for the next page after the last loaded row in the current sort order and filter
+        self.loading = True
+        self.executor.submit(
+            self.request_key, Ledger.fetch_transactions_page,
+            self.COLUMNS[self.sort_column][1],
+            self.sort_order == Qt.DescendingOrder,
+            self.category_filter,
+            self.rows[-1] if self.rows else None,
+            self.PAGE_SIZE,
+            on_result=self.append_page,
+            on_error=self.page_failed,
+        )
+
+    def append_page(self, page):
+        self.loading = False
+        if len(page) < self.PAGE_SIZE:
+            self.exhausted = True
+        if page:
+            self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(page) - 1)
+            self.rows.extend(page)
+            self.endInsertRows()
+
+    def page_failed(self, error):
+        print("Query failed: ", error)
+        self.loading = False
+        self.exhausted = True
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        # Only indexed columns can be sorted; the view puts the indicator back for the others
+        if self.COLUMNS[column][1] not in TRANSACTION_SORT_COLUMNS:
+            return
+        if (column, order) == (self.sort_column, self.sort_order):
+            return
+        self.sort_column = column
+        self.sort_order = order
+        self.refresh()
+
+    def set_category_filter(self, category):
+        self.category_filter = category
+        self.refresh()
+
+    def refresh(self):
+        # Drop the loaded pages and start again from the first one; any page still in flight is superseded
+        self.beginResetModel()
+        self.rows = []
+        self.exhausted = False
+        self.loading = False
+        self.endResetModel()
+        self.fetchMore()
+
+    def insert_transaction(self, row):
+        # Place a newly added (id, date, category, amount, memo) row without re-reading any pages
+        if self.category_filter is not None and row[2] != self.category_filter:
+            return
+        sort_key = self.row_sort_key(row)
+        if sort_key is None:
+            self.refresh()
+            return
+        descending = self.sort_order == Qt.DescendingOrder
+        position = len(self.rows)
+        for i, loaded_row in enumerate(self.rows):
+            loaded_key = self.row_sort_key(loaded_row)
+            if loaded_key is None:
+                self.refresh()
+                return
+            if (sort_key > loaded_key) if descending else (sort_key < loaded_key):
+                position = i
+                break
+        # Rows past the loaded window will be picked up by a later fetchMore
+        if position == len(self.rows) and not self.exhausted:
+            return
+        self.beginInsertRows(QModelIndex(), position, position)
+        self.rows.insert(position, row)
+        self.endInsertRows()
+
+    def row_sort_key(self, row):
+        # Python equivalent of the ORDER BY key, or None if it can't be compared safely
+        values = [row[index] for index, _ in TRANSACTION_SORT_KEYS[self.COLUMNS[self.sort_column][1]]]
+        if self.COLUMNS[self.sort_column][1] == "amount":
+            try:
+                values = [float(values[0])]
+            except (TypeError, ValueError):
+                return None
+        return (*values, row[0])
+
+class BalanceHistoryChart(QWidget):
+    # Line chart of each account's total over time buckets, drawn directly with QPainter.
+    # It only ever holds one point per account per bucket, as downsampled by the ledger.
+    MARGIN = 50
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.buckets = []
+        self.series = {}  # account_name -> {bucket: total}
+        self.setMinimumHeight(200)
+
+    def set_history(self, rows):
+        self.series = {}
+        buckets = set()
+        for account_name, bucket, total in rows:
+            try:
+                total = float(total)
+            except (TypeError, ValueError):
+                # Skip snapshots whose total isn't a number
+                continue
+            self.series.setdefault(account_name, {})[bucket] = total
+            buckets.add(bucket)
+        self.buckets = sorted(buckets)
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.fillRect(self.rect(), Qt.white)
+        if not self.buckets:
+            painter.drawText(self.rect(), Qt.AlignCenter, "No balance snapshots yet")
+            return
+
+        # Plot area and value range
+        left, top = self.MARGIN + 20, self.MARGIN // 2
+        width = max(self.width() - left - self.MARGIN // 2, 1)
+        height = max(self.height() - top - self.MARGIN, 1)
+        values = [total for points in self.series.values() for total in points.values()]
+        low, high = min(values + [0.0]), max(values + [0.0])
+        if high == low:
+            high = low + 1
+
+        def x_for(index):
+            return left + (width * index / (len(self.buckets) - 1) if len(self.buckets) > 1 else width / 2)
+
+        def y_for(value):
+            return top + height - (value - low) * height / (high - low)
+
+        # Axes with four value gridlines and the first and last bucket labels
+        painter.setPen(QPen(QColor("#dddddd")))
+        for step in range(5):
+            value = low + (high - low) * step / 4
+            y = y_for(value)
+            painter.drawLine(int(left), int(y), int(left + width), int(y))
+            painter.setPen(QPen(Qt.black))
+            painter.drawText(0, int(y) - 8, left - 6, 16, Qt.AlignRight | Qt.AlignVCenter, f"{value:,.0f}")
+            painter.setPen(QPen(QColor("#dddddd")))
+        painter.setPen(QPen(Qt.black))
+        painter.drawText(int(left), top + height + 6, 120, 16, Qt.AlignLeft, self.buckets[0])
+        painter.drawText(int(left + width) - 120, top + height + 6, 120, 16, Qt.AlignRight, self.buckets[-1])
+
+        # One line per account, plus a legend entry
+        bucket_index = {bucket: index for index, bucket in enumerate(self.buckets)}
+        for series_index, (account_name, points) in enumerate(sorted(self.series.items())):
+            color = QColor(CHART_COLORS[series_index % len(CHART_COLORS)])
+            painter.setPen(QPen(color, 2))
+            previous = None
+            for bucket in sorted(points):
+                point = (int(x_for(bucket_index[bucket])), int(y_for(points[bucket])))
+                if previous is not None:
+                    painter.drawLine(previous[0], previous[1], point[0], point[1])
+                painter.drawEllipse(point[0] - 2, point[1] - 2, 4, 4)
+                previous = point
+            painter.drawText(int(left) + 10, top + 16 * (series_index + 1), account_name)
+
+
+class CategoryManagerDialog(QDialog):
+    # Add, rename and remove categories and set their monthly budgets. Changes are written on the
+    # writer thread; categories_changed(renamed) or budget_changed(category, limit) fires after each
+    # one so the main window can catch up.
+    categories_changed = pyqtSignal(bool)
+    budget_changed = pyqtSignal(str, object)
+
+    def __init__(self, executor, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Manage Categories")
+        self.executor = executor
+        self.categories = []  # (id, name)
+        self.budgets = {}  # name -> monthly limit
+
+        layout = QGridLayout(self)
+        self.category_view = QListWidget()
+        self.category_view.currentRowChanged.connect(self.category_selected)
+        self.name_input = QLineEdit()
+        self.add_button = QPushButton("Add")
+        self.add_button.clicked.connect(self.add_category)
+        self.rename_button = QPushButton("Rename")
+        self.rename_button.clicked.connect(self.rename_category)
+        self.remove_button = QPushButton("Remove")
+        self.remove_button.clicked.connect(self.remove_category)
+        self.budget_input = QLineEdit()
+        self.budget_input.setPlaceholderText("Monthly budget (blank for none)")
+        self.budget_button = QPushButton("Set Budget")
+        self.budget_button.clicked.connect(self.set_budget)
+        self.status_label = QLabel()
+
+        layout.addWidget(self.category_view, 0, 0, 1, 3)
+        layout.addWidget(self.name_input, 1, 0, 1, 3)
+        layout.addWidget(self.add_button, 2, 0)
+        layout.addWidget(self.rename_button, 2, 1)
+        layout.addWidget(self.remove_button, 2, 2)
+        layout.addWidget(self.budget_input, 3, 0, 1, 2)
+        layout.addWidget(self.budget_button, 3, 2)
+        layout.addWidget(self.status_label, 4, 0, 1, 3)
+
+    def set_categories(self, categories):
+        selected = self.selected_category()
+        self.categories = categories
+        self.category_view.blockSignals(True)
+        self.category_view.clear()
+        self.category_view.addItems([name for _, name in categories])
+        for row, (category_id, _) in enumerate(categories):
+            if selected is not None and category_id == selected[0]:
+                self.category_view.setCurrentRow(row)
+        self.category_view.blockSignals(False)
+
+    def selected_category(self):
+        row = self.category_view.currentRow()
+        return self.categories[row] if 0 <= row < len(self.categories) else None
+
+    def set_budgets(self, budgets):
+        self.budgets = dict(budgets)
+        self.category_selected(self.category_view.currentRow())
+
+    def category_selected(self, row):
+        if 0 <= row < len(self.categories):
+            name = self.categories[row][1]
+            self.name_input.setText(name)
+            budget = self.budgets.get(name)
+            self.budget_input.setText("" if budget is None else f"{budget:.2f}")
+
+    def add_category(self):
+        name = self.name_input.text()
+        self.submit(Ledger.add_category, name, message=f"Added {name.strip()}", renamed=False)
+
+    def rename_category(self):
+        selected = self.selected_category()
+        if selected is None:
+            self.status_label.setText("Select a category to rename.")
+            return
+        name = self.name_input.text()
+        self.submit(Ledger.rename_category, selected[0], name,
+                    message=f"Renamed {selected[1]} to {name.strip()}", renamed=True)
+
+    def remove_category(self):
+        selected = self.selected_category()
+        if selected is None:
+            self.status_label.setText("Select a category to remove.")
+            return
+        self.submit(Ledger.delete_category, selected[0], message=f"Removed {selected[1]}", renamed=False)
+
+    def set_budget(self):
+        selected = self.selected_category()
+        if selected is None:
+            self.status_label.setText("Select a category to budget.")
+            return
+        budget = self.budget_input.text().strip() or None
+        message = f"{selected[1]} budget set to {budget} a month" if budget else f"Removed the {selected[1]} budget"
+        self.executor.submit(None, Ledger.set_budget, selected[0], budget, write=True,
+                             on_result=lambda limit: self.budget_set(selected[1], limit, message),
+                             on_error=self.change_failed)
+
+    def budget_set(self, category, limit, message):
+        self.status_label.setText(message)
+        if limit is None:
+            self.budgets.pop(category, None)
+        else:
+            self.budgets[category] = limit
+        self.budget_changed.emit(category, limit)
+
+    def submit(self, function, *args, message, renamed):
+        self.executor.submit(None, function, *args, write=True,
+                             on_result=lambda _: self.changed(message, renamed),
+                             on_error=self.change_failed)
+
+    def changed(self, message, renamed):
+        self.status_label.setText(message)
+        self.categories_changed.emit(renamed)
+
+    def change_failed(self, error):
+        # ValueErrors are the ledger refusing the change, e.g. a duplicate name or a category still in use
+        if not isinstance(error, ValueError):
+            print("Category error: ", error)
+        self.status_label.setText(str(error))
+
+
+class StartupTimer:
+    # Records how long each startup phase takes so time-to-first-paint can be watched as the database grows.
+    # Enable the report with --startup-report or BUDGET_TRACKER_STARTUP_REPORT=1.
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.phases = []
+        self.reported = False
+
+    def record(self, phase, seconds):
+        self.phases.append((phase, seconds))
+        # Phases after the startup report (tabs opened later) are reported as they happen
+        if self.enabled and self.reported:
+            print(f"{phase:<40} {seconds * 1000:>9.1f} ms")
+
+    @contextmanager
+    def measure(self, phase):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, time.perf_counter() - started)
+
+    def report(self):
+        self.reported = True
+        if not self.enabled:
+            return
+        print("Startup timing")
+        for phase, seconds in self.phases:
+            print(f"{phase:<40} {seconds * 1000:>9.1f} ms")
+        print(f"{'Total since process start':<40} {(time.perf_counter() - STARTUP_STARTED) * 1000:>9.1f} ms")
+
+
+startup_timer = StartupTimer('--startup-report' in sys.argv or bool(os.environ.get('BUDGET_TRACKER_STARTUP_REPORT')))
+
 
 class BudgetTracker(QMainWindow):
+    # Tab indexes, in the order they are added
+    ENTRY_TAB, ACCOUNTS_TAB, MONTHLY_TAB, EXCEL_TAB, HISTORY_TAB, ANALYTICS_TAB, SEARCH_TAB, DIAGNOSTICS_TAB = range(8)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Budget Tracker")
         self.setGeometry(100, 100, 800, 600)
 
+        # The database is opened on a worker thread after the window is first shown
+        self.executor = None
+        self.database_ready = False
+        self.startup_scheduled = False
+
+        # Columnar copy of the transactions for the Analytics tab, loaded when the tab is first shown.
+        # It only takes rows it has read itself, past its last id, so rows other clients committed in
+        # between are never skipped. Rows added while a read is running mark it stale for another read.
+        self.analytics_columns = None
+        self.analytics_reading = False
+        self.analytics_stale = False
+
+        # This month's spending against the category budgets, seeded when the Item Entry tab is populated
+        self.budget_monitor = None
+
+        # Last PRAGMA data_version seen on the writer connection; it changes when anything else commits
+        self.data_version = None
+        self.data_version_timer = QTimer(self)
+        self.data_version_timer.timeout.connect(self.poll_data_version)
+
+        # Categories are read from the database once it is open, as (id, name) in the order they were added
+        self.categories = []
+        self.category_list = []
+        self.category_manager = None
+
+        self.main_accounts = ["Acoount1", "Acoount2", "Acoount3"]
+        self.sub_accounts = {
+            "Acoount1": ["Checking", "Savings", "Saver", "Kiwi Saver"],
+            "Acoount2": ["Checking", "Savings", "Saver", "Kiwi Saver"],
+            "Acoount3": ["Checking", "Savings"]
+        }
+
         # Create a tab widget
         self.tabs = QTabWidget()
         self.setCentralWidget(self.tabs)
 
+        # Tabs start out empty and are built, then populated from the database, the first time they are shown
+        self.tab_builders = [
+            ("Item Entry", self.build_entry_tab, self.populate_entry_tab),
+            ("Accounting Details", self.build_accounts_tab, self.load_latest_accounting_details),
+            ("Monthly Accounts", self.build_monthly_tab, self.populate_monthly_tab),
+            ("Excel Input", self.setup_ui, None),
+            ("Balance History", self.build_history_tab, self.load_balance_history),
+            ("Analytics", self.build_analytics_tab, self.load_analytics),
+            ("Search", self.build_search_tab, self.run_search),
+            ("Diagnostics", self.build_diagnostics_tab, self.refresh_diagnostics),
+        ]
+        self.built_tabs = set()
+        for title, _, _ in self.tab_builders:
+            self.tabs.addTab(QWidget(), title)
+        self.tabs.currentChanged.connect(self.ensure_tab_built)
+
+        # Add a menu item to exit
+        exit_action = QAction("Exit", self)
+        exit_action.triggered.connect(self.close)
+        self.menuBar().addAction(exit_action)
+
+        # Add a menu item to check and rebuild the monthly summary table
+        rebuild_totals_action = QAction("Rebuild Monthly Totals", self)
+        rebuild_totals_action.triggered.connect(self.check_monthly_totals)
+        self.menuBar().addAction(rebuild_totals_action)
+
+        # Add a menu item to add, rename and remove categories
+        manage_categories_action = QAction("Manage Categories", self)
+        manage_categories_action.triggered.connect(self.open_category_manager)
+        self.menuBar().addAction(manage_categories_action)
+
+        # Only the tab that is visible at startup is built now
+        self.ensure_tab_built(self.tabs.currentIndex())
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        # Defer database work until the window has had a chance to paint
+        if not self.startup_scheduled:
+            self.startup_scheduled = True
+            startup_timer.record("Window shown (since process start)", time.perf_counter() - STARTUP_STARTED)
+            QTimer.singleShot(0, self.finish_startup)
+
+    def finish_startup(self):
+        self.database_open_started = time.perf_counter()
+        self.initialize_db()
+
+    def database_opened(self, _):
+        startup_timer.record("Database open", time.perf_counter() - self.database_open_started)
+        self.database_ready = True
+
+        # Populate whichever tabs were built before the database was ready
+        for index in sorted(self.built_tabs):
+            self.populate_tab(index)
+        startup_timer.report()
+
+        # Watch for rows written by other clients
+        self.poll_data_version()
+        self.data_version_timer.start(DATA_VERSION_POLL_MS)
+
+    def poll_data_version(self):
+        # Asked on the writer connection, whose own inserts don't change it, so only outside writes are noticed
+        self.executor.submit("data-version", Ledger.get_data_version, write=True,
+                             on_result=self.data_version_read,
+                             on_error=lambda error: print("Data version error: ", error))
+
+    def data_version_read(self, version):
+        changed = self.data_version is not None and version != self.data_version
+        self.data_version = version
+        if changed:
+            self.transactions_changed()
+
+    def database_failed(self, error):
+        print("Error: ", error)
+        print("Failed to initialize the database")
+        self.tabs.setEnabled(False)
+        startup_timer.report()
+
+    def ensure_tab_built(self, index):
+        if index < 0 or index in self.built_tabs:
+            return
+        title, build, _ = self.tab_builders[index]
+        with startup_timer.measure(f"Build tab: {title}"):
+            build()
+        self.built_tabs.add(index)
+        if self.database_ready:
+            self.populate_tab(index)
+
+    def populate_tab(self, index):
+        title, _, populate = self.tab_builders[index]
+        if populate is None:
+            return
+        with startup_timer.measure(f"Populate tab: {title}"):
+            populate()
+
+    def tab_ready(self, index):
+        # True once a tab's widgets exist and have been loaded from the database
+        return index in self.built_tabs and self.database_ready
+
+    def build_entry_tab(self):
         # Create the first tab for item entry and display
-        self.tab1 = QWidget()
-        self.tabs.addTab(self.tab1, "Item Entry")
+        self.tab1 = self.tabs.widget(self.ENTRY_TAB)
 
         # Layout for the first tab
         self.tab1_layout = QGridLayout(self.tab1)
@@ -27,60 +605,70 @@ class BudgetTracker(QMainWindow):
         # Create input fields for date, category, and amount
         self.date_input = QDateEdit(calendarPopup=True)
         self.date_input.setDate(QDate.currentDate())
-        self.date_input.setDisplayFormat('dd-MMM-yy')
+        self.date_input.setDisplayFormat(QT_DISPLAY_DATE_FORMAT)
 
         # Create a dropdown for categories
         self.category_input = QComboBox()
-        category_list = [
-            "Salary", "Rent", "Karate", "Broadband", "Phone",
-            "Electricity", "Water", "Sam", "Food", "Eating out",
-            "Sid", "Divs", "Car", "Remit", "Insurance", "Lotto",
-            "Electronix", "Medical", "Laundry", "Trip", "General"
-        ]
-        self.category_input.addItems(category_list)
+        self.category_input.addItems(self.category_list)
 
         self.amount_input = QLineEdit()
+        self.memo_input = QLineEdit()
+        self.memo_input.setPlaceholderText("Payee / memo (optional)")
 
         # Create a submit button
         self.submit_button = QPushButton('Submit')
         self.submit_button.clicked.connect(self.add_transaction_from_input)
 
         # Add widgets to the left quadrant (0, 0)
-        self.tab1_layout.setRowStretch(4, 1)
+        self.tab1_layout.setRowStretch(6, 1)
         self.tab1_layout.setVerticalSpacing(10)
         self.tab1_layout.addWidget(self.date_input, 0, 0)
         self.tab1_layout.addWidget(self.category_input, 1, 0)
         self.tab1_layout.addWidget(self.amount_input, 2, 0)
-        self.tab1_layout.addWidget(self.submit_button, 3, 0)
-
-        # Create a table to display transactions
-        self.table = QTableWidget()
-        self.table.setColumnCount(3)
-        self.table.setHorizontalHeaderLabels(["Date", "Category", "Amount"])
-        self.table.setRowCount(10)  # Set the number of rows you want to be visible
-
-        # Set minimum row heights to ensure all rows are visible
-        for row in range(10):
-            self.table.setRowHeight(row, 20)  # Adjust the row height as needed
-
-        # Add the table to the layout with appropriate row span to accommodate all rows
-        self.tab1_layout.addWidget(self.table, 0, 1, 10, 1)  # Span 10 rows instead of 4
-
+        self.tab1_layout.addWidget(self.memo_input, 3, 0)
+        self.tab1_layout.addWidget(self.submit_button, 4, 0)
+
+        # Remaining budget for the selected category, counting the amount being typed
+        self.budget_status_label = QLabel()
+        self.budget_status_label.setWordWrap(True)
+        self.tab1_layout.addWidget(self.budget_status_label, 5, 0)
+
+        # Create a dropdown to filter the transaction history by category
+        self.category_filter_input = QComboBox()
+        self.category_filter_input.addItems([ALL_CATEGORIES] + self.category_list)
+
+        # Create a view over the full transaction history; its model is attached once the database is open
+        self.table = QTableView()
+        self.table.verticalHeader().setVisible(False)
+        self.table.verticalHeader().setDefaultSectionSize(20)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+
+        # Add the filter and table to the layout, spanning the rows beside the entry form
+        self.tab1_layout.addWidget(self.category_filter_input, 0, 1)
+        self.tab1_layout.addWidget(self.table, 1, 1, 9, 1)
+
+    def populate_entry_tab(self):
+        # Attach the paged transaction model; sorting and filtering are done in SQL
+        self.transaction_model = TransactionTableModel(self.executor, self)
+        self.table.setModel(self.transaction_model)
+        self.table.horizontalHeader().setSortIndicator(0, Qt.DescendingOrder)
+        self.table.setSortingEnabled(True)
+        self.table.horizontalHeader().sortIndicatorChanged.connect(self.history_sort_changed)
+        self.category_filter_input.currentIndexChanged.connect(self.update_category_filter)
+        self.category_input.currentIndexChanged.connect(self.show_budget_status)
+        self.amount_input.textChanged.connect(self.show_budget_status)
+        self.load_categories()
+        self.load_budget_monitor()
+
+    def build_accounts_tab(self):
         # Create the second tab for accounting details
-        self.tab2 = QWidget()
-        self.tabs.addTab(self.tab2, "Accounting Details")
+        self.tab2 = self.tabs.widget(self.ACCOUNTS_TAB)
 
         # Layout for the second tab
         self.tab2_layout = QGridLayout(self.tab2)
 
         # Create UI components for account balances in the top right quadrant
         self.account_balance_widgets = {}
-        self.main_accounts = ["Acoount1", "Acoount2", "Acoount3"]
-        self.sub_accounts = {
-            "Acoount1": ["Checking", "Savings", "Saver", "Kiwi Saver"],
-            "Acoount2": ["Checking", "Savings", "Saver", "Kiwi Saver"],
-            "Acoount3": ["Checking", "Savings"]
-        }
 
         # Determine the unique sub-accounts to set as column headers
         unique_sub_accounts = set()
@@ -127,30 +715,17 @@ class BudgetTracker(QMainWindow):
         self.tab2_layout.addWidget(update_button, 1, 0, 1, -1)  # Span all columns
         update_button.clicked.connect(self.save_accounting_details)
 
-        # Add a menu item to exit
-        exit_action = QAction("Exit", self)
-        exit_action.triggered.connect(self.close)
-        self.menuBar().addAction(exit_action)
-
-        if not self.initialize_db():
-            print("Failed to initialize the database")
-            return
-        
-        # Call this method after initializing the database and setting up the UI components
-        self.load_latest_accounting_details()
-
+    def build_monthly_tab(self):
         # Create the third tab for monthly accounts
-        self.tab3 = QWidget()
-        self.tabs.addTab(self.tab3, "Monthly Accounts")
+        self.tab3 = self.tabs.widget(self.MONTHLY_TAB)
 
         # Layout for the third tab
         self.tab3_layout = QGridLayout(self.tab3)
 
         # Create a dropdown for months
         self.month_input = QComboBox()
-        # Assuming you have a method to get the list of months from the database
-        self.month_list = self.get_month_list()
-        self.month_input.addItems(self.month_list)
+        self.month_keys = []
+        self.month_list = []
 
         # Create a table to display monthly spending
         self.monthly_spending_table = QTableWidget()
@@ -164,16 +739,13 @@ class BudgetTracker(QMainWindow):
         # Connect the month dropdown selection change to the update function
         self.month_input.currentIndexChanged.connect(self.update_monthly_spending_table)
 
-        # Refresh the table view
-        self.refresh_table()  # Call the refresh method
-
-        # Create the fourth tab for Excel file input
-        self.setup_ui()
+    def populate_monthly_tab(self):
+        # Sorted 'YYYY-MM' keys of months with data, alongside their combo labels
+        self.reload_month_list()
 
     def setup_ui(self):
         # Create the fourth tab for Excel file input
-        self.tab4 = QWidget()
-        self.tabs.addTab(self.tab4, "Excel Input")
+        self.tab4 = self.tabs.widget(self.EXCEL_TAB)
 
         # Layout for the fourth tab
         self.tab4_layout = QGridLayout(self.tab4)
@@ -183,38 +755,346 @@ class BudgetTracker(QMainWindow):
         self.select_file_button.clicked.connect(self.open_file_dialog)
         self.tab4_layout.addWidget(self.select_file_button, 0, 0)
 
-    def read_and_update_database(file_path, database_path):
-        # Read the Excel file into a pandas DataFrame
-        df = pd.read_excel(file_path)
-        
-        # Replace NaN values with 0 for expenditures not made in certain months
-        df.fillna(0, inplace=True)
-        
-        # Create a database engine using the database path
-        engine = create_engine(f'sqlite:///{database_path}')
-        
-        # Assuming you have a table named 'expenditures' in your 'budget_tracker.db'
-        table_name = 'expenditures'
-        
-        # Loop through each month's column in DataFrame starting from index 1 since index 0 is categories
-        for month_col in df.columns[1:]:
-            # Create a temporary DataFrame with 'Category' and 'Expenditure' columns
-            temp_df = pd.DataFrame({
-                'Category': df.iloc[:, 0],
-                'Expenditure': df[month_col],
-                'Month': month_col  # Add the month as a column for reference
-            })
-            
-            # Append data to the database
-            temp_df.to_sql(table_name, con=engine, if_exists='append', index=False)
+        # Create a button for importing a bank statement CSV; lines imported before are skipped
+        self.select_statement_button = QPushButton('Import Bank Statement CSV')
+        self.select_statement_button.clicked.connect(self.open_statement_dialog)
+        self.tab4_layout.addWidget(self.select_statement_button, 1, 0)
+
+        # Show the outcome of the last import
+        self.import_status_label = QLabel()
+        self.tab4_layout.addWidget(self.import_status_label, 2, 0)
+        self.tab4_layout.setRowStretch(3, 1)
+
+    def build_history_tab(self):
+        # Create the fifth tab for account balance history
+        self.tab5 = self.tabs.widget(self.HISTORY_TAB)
+
+        # Layout for the fifth tab
+        self.tab5_layout = QGridLayout(self.tab5)
+
+        # Create a dropdown for the time bucket each point summarises
+        self.history_bucket_input = QComboBox()
+        for label, bucket in BALANCE_HISTORY_BUCKETS:
+            self.history_bucket_input.addItem(label, bucket)
+        self.history_bucket_input.setCurrentIndex(1)  # Monthly
+        self.history_bucket_input.currentIndexChanged.connect(self.load_balance_history)
+
+        self.balance_history_chart = BalanceHistoryChart()
+
+        # Add widgets to the fifth tab layout
+        self.tab5_layout.addWidget(self.history_bucket_input, 0, 0)
+        self.tab5_layout.addWidget(self.balance_history_chart, 1, 0, 1, -1)  # Span all columns
+        self.tab5_layout.setRowStretch(1, 1)
+
+    def load_balance_history(self):
+        # Read one downsampled point per account per bucket
+        self.executor.submit("balance-history", Ledger.get_balance_history, self.history_bucket_input.currentData(),
+                             on_result=self.balance_history_chart.set_history)
+
+    def build_analytics_tab(self):
+        # Create the sixth tab for spending trends
+        self.tab6 = self.tabs.widget(self.ANALYTICS_TAB)
+
+        # Layout for the sixth tab
+        self.tab6_layout = QGridLayout(self.tab6)
+
+        self.analytics_status_label = QLabel()
+        self.analytics_table = QTableWidget()
+        self.analytics_table.setColumnCount(len(ANALYTICS_COLUMNS))
+        self.analytics_table.setHorizontalHeaderLabels([label for label, _ in ANALYTICS_COLUMNS])
+        self.analytics_table.setEditTriggers(QTableWidget.NoEditTriggers)
+
+        # Add widgets to the sixth tab layout
+        self.tab6_layout.addWidget(self.analytics_status_label, 0, 0)
+        self.tab6_layout.addWidget(self.analytics_table, 1, 0)
+
+        # Trends are recomputed from the cache whenever the tab is shown
+        self.tabs.currentChanged.connect(self.analytics_tab_shown)
+
+    def analytics_tab_shown(self, index):
+        if index == self.ANALYTICS_TAB and self.analytics_columns is not None:
+            self.show_analytics()
+
+    def load_analytics(self):
+        # Read the whole transactions table into the columnar cache on a worker thread
+        self.executor.cancel("analytics-rows")
+        self.analytics_reading = True
+        self.analytics_stale = False
+        self.analytics_status_label.setText("Loading transactions...")
+        self.executor.submit("analytics-columns", load_transaction_columns,
+                             on_result=self.analytics_loaded, on_error=self.analytics_failed)
+
+    def refresh_analytics(self):
+        # Catch the cache up with rows committed since it was read, by this window or any other client
+        if self.analytics_reading:
+            # The running read may have started before those rows were committed, so read again after it
+            self.analytics_stale = True
+            return
+        if self.analytics_columns is None:
+            self.load_analytics()
+            return
+        self.analytics_reading = True
+        self.analytics_stale = False
+        self.executor.submit("analytics-rows", read_transaction_rows, self.analytics_columns.last_id,
+                             on_result=self.analytics_rows_read, on_error=self.analytics_failed)
+
+    def analytics_loaded(self, columns):
+        self.analytics_columns = columns
+        self.analytics_rows_read([])
+
+    def analytics_rows_read(self, rows):
+        # Rows come back in id order, so the cache's last id never moves past a row it hasn't read
+        self.analytics_columns.extend(rows)
+        self.analytics_reading = False
+        if self.analytics_stale:
+            self.refresh_analytics()
+        self.show_analytics()
+
+    def analytics_failed(self, error):
+        self.analytics_reading = False
+        self.analytics_stale = False
+        if isinstance(error, ImportError):
+            print("The Analytics tab needs the numpy package: pip install numpy")
+            self.analytics_status_label.setText("The Analytics tab needs numpy (pip install numpy).")
+        else:
+            print("Analytics error: ", error)
+            self.analytics_status_label.setText("Could not load transactions, see the console for details.")
+
+    def show_analytics(self):
+        # Everything is computed from the in-memory arrays, no SQL involved
+        from analytics import category_summary
+
+        started = time.perf_counter()
+        summary = category_summary(self.analytics_columns)
+        elapsed = time.perf_counter() - started
+
+        rows = summary['categories']
+        self.analytics_table.setRowCount(len(rows))
+        for row, trends in enumerate(rows):
+            for column, (_, key) in enumerate(ANALYTICS_COLUMNS):
+                value = trends[key]
+                if key == 'category':
+                    item = QTableWidgetItem(value)
+                else:
+                    item = QTableWidgetItem("" if math.isnan(value) else f"{value:.2f}")
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.analytics_table.setItem(row, column, item)
+        self.analytics_table.resizeColumnsToContents()
+
+        as_of = summary['as_of'].strftime('%d-%b-%Y') if summary['as_of'] else "no transactions"
+        self.analytics_status_label.setText(
+            f"As of {as_of}: {len(self.analytics_columns)} transactions analysed in {elapsed * 1000:.1f} ms. "
+            "Averages and year-over-year change cover complete months; the forecast extends this month's pace.")
+
+    def build_search_tab(self):
+        # Create the seventh tab for searching transaction memos
+        self.tab7 = self.tabs.widget(self.SEARCH_TAB)
+
+        # Layout for the seventh tab
+        self.tab7_layout = QGridLayout(self.tab7)
+
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search payees and memos")
+        self.search_status_label = QLabel()
+        self.search_results_table = QTableWidget()
+        self.search_results_table.setColumnCount(4)
+        self.search_results_table.setHorizontalHeaderLabels(["Date", "Category", "Amount", "Memo"])
+        self.search_results_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.search_results_table.horizontalHeader().setStretchLastSection(True)
+
+        # Add widgets to the seventh tab layout
+        self.tab7_layout.addWidget(self.search_input, 0, 0)
+        self.tab7_layout.addWidget(self.search_status_label, 1, 0)
+        self.tab7_layout.addWidget(self.search_results_table, 2, 0)
+
+        # Search as the user types, once they pause
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.run_search)
+        self.search_input.textChanged.connect(self.search_timer.start)
+        self.search_input.returnPressed.connect(self.run_search)
+
+    def run_search(self):
+        self.search_timer.stop()
+        if not self.database_ready:
+            return
+        text = self.search_input.text()
+        if not text.split():
+            self.executor.cancel("search")
+            self.search_results_table.setRowCount(0)
+            self.search_status_label.setText("")
+            return
+        # A newer search supersedes one still running
+        self.executor.submit("search", search_memos, text, on_result=self.show_search_results,
+                             on_error=lambda error: print("Search error: ", error))
+
+    def show_search_results(self, result):
+        rows, count, total, elapsed = result
+        self.search_results_table.setRowCount(len(rows))
+        for row, (_, date, category, amount, memo) in enumerate(rows):
+            self.search_results_table.setItem(row, 0, QTableWidgetItem(format_display_date(date)))
+            self.search_results_table.setItem(row, 1, QTableWidgetItem(category))
+            amount_item = QTableWidgetItem(str(amount))
+            amount_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+            self.search_results_table.setItem(row, 2, amount_item)
+            self.search_results_table.setItem(row, 3, QTableWidgetItem(memo))
+        shown = f", newest {len(rows)} shown" if len(rows) < count else ""
+        self.search_status_label.setText(
+            f"{count} matching transactions totalling {total:.2f}{shown} ({elapsed * 1000:.1f} ms)")
+
+    def build_diagnostics_tab(self):
+        # Create the eighth tab for per-query latency statistics
+        self.tab8 = self.tabs.widget(self.DIAGNOSTICS_TAB)
+
+        # Layout for the eighth tab
+        self.tab8_layout = QGridLayout(self.tab8)
+
+        refresh_button = QPushButton("Refresh")
+        refresh_button.clicked.connect(self.refresh_diagnostics)
+        reset_button = QPushButton("Reset")
+        reset_button.clicked.connect(self.reset_diagnostics)
+        self.diagnostics_summary_label = QLabel()
+
+        # One row per distinct statement, with its latency histogram in the trailing columns
+        self.query_stats_table = QTableWidget()
+        self.query_stats_table.setColumnCount(8 + len(latency_bucket_labels()))
+        self.query_stats_table.setHorizontalHeaderLabels(
+            ["Query", "Calls", "Avg ms", "Max ms", "Total ms", "Rows", "Binds", "Errors"] + latency_bucket_labels())
+        self.query_stats_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.query_stats_table.setWordWrap(False)
+
+        # The most recent statements over the slow threshold, with their query plans
+        self.slow_queries_table = QTableWidget()
+        self.slow_queries_table.setColumnCount(5)
+        self.slow_queries_table.setHorizontalHeaderLabels(["Time", "ms", "Rows", "Query", "Plan"])
+        self.slow_queries_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.slow_queries_table.setWordWrap(False)
+
+        # Add widgets to the eighth tab layout
+        self.tab8_layout.addWidget(self.diagnostics_summary_label, 0, 0)
+        self.tab8_layout.addWidget(refresh_button, 0, 1)
+        self.tab8_layout.addWidget(reset_button, 0, 2)
+        self.tab8_layout.addWidget(self.query_stats_table, 1, 0, 1, -1)  # Span all columns
+        self.tab8_layout.addWidget(QLabel("Recent slow queries"), 2, 0)
+        self.tab8_layout.addWidget(self.slow_queries_table, 3, 0, 1, -1)
+        self.tab8_layout.setRowStretch(1, 2)
+        self.tab8_layout.setRowStretch(3, 1)
+
+        # Statistics keep changing in the background, so re-read them whenever the tab is shown
+        self.tabs.currentChanged.connect(self.diagnostics_tab_shown)
+
+    def diagnostics_tab_shown(self, index):
+        if index == self.DIAGNOSTICS_TAB and self.tab_ready(index):
+            self.refresh_diagnostics()
+
+    def refresh_diagnostics(self):
+        # The statistics live in this process, so they are read directly rather than through the executor
+        queries, recent_slow = query_stats.snapshot()
+        self.diagnostics_summary_label.setText(
+            f"{sum(totals['calls'] for totals in queries)} statements, "
+            f"{sum(totals['total_ms'] for totals in queries):.1f} ms in total. "
+            f"Statements over {SLOW_QUERY_THRESHOLD_MS:g} ms are logged to {SLOW_QUERY_LOG_PATH}.")
+
+        self.query_stats_table.setRowCount(len(queries))
+        for row, totals in enumerate(queries):
+            values = [totals['sql'], totals['calls'], f"{totals['avg_ms']:.3f}", f"{totals['max_ms']:.3f}",
+                      f"{totals['total_ms']:.1f}", totals['rows'], totals['binds'], totals['errors']]
+            for column, value in enumerate(values + totals['histogram']):
+                item = QTableWidgetItem(str(value))
+                if column == 0:
+                    item.setToolTip(totals['sql'])
+                self.query_stats_table.setItem(row, column, item)
+        self.query_stats_table.resizeColumnsToContents()
+        self.query_stats_table.setColumnWidth(0, min(self.query_stats_table.columnWidth(0), 400))
+
+        # Newest slow statement first
+        self.slow_queries_table.setRowCount(len(recent_slow))
+        for row, entry in enumerate(reversed(recent_slow)):
+            plan = " / ".join(entry['plan'])
+            values = [entry['time'], f"{entry['ms']:.1f}", entry['rows'], entry['sql'], plan]
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(str(value))
+                item.setToolTip(entry['sql'] + "\n\n" + "\n".join(entry['plan']))
+                self.slow_queries_table.setItem(row, column, item)
+        self.slow_queries_table.resizeColumnsToContents()
+        self.slow_queries_table.setColumnWidth(3, min(self.slow_queries_table.columnWidth(3), 400))
+
+    def reset_diagnostics(self):
+        query_stats.reset()
+        self.refresh_diagnostics()
 
     def open_file_dialog(self):
         options = QFileDialog.Options()
         options |= QFileDialog.DontUseNativeDialog
         file_name, _ = QFileDialog.getOpenFileName(self, "Select Excel File", "", "Excel Files (*.xlsx);;All Files (*)", options=options)
-        if file_name:
-            # Call the function to handle the file and update the database
-            read_and_update_database(file_name, 'path_to_your_budget_tracker.db')
+        if not file_name:
+            return
+
+        # Import the workbook on the writer thread so the window stays responsive
+        self.select_file_button.setEnabled(False)
+        self.import_status_label.setText(f"Importing {file_name}...")
+        self.executor.submit(None, Ledger.import_excel, file_name, write=True,
+                             on_result=self.excel_imported, on_error=self.excel_import_failed)
+
+    def excel_imported(self, result):
+        imported, elapsed = result
+        rate = imported / elapsed if elapsed > 0 else 0
+        print(f"Imported {imported} transactions in {elapsed:.2f}s ({rate:.0f} rows/sec)")
+        self.select_file_button.setEnabled(True)
+        self.import_status_label.setText(f"Imported {imported} transactions in {elapsed:.2f}s ({rate:.0f} rows/sec)")
+        self.transactions_changed()
+
+    def excel_import_failed(self, error):
+        if isinstance(error, ImportError):
+            print("Excel import needs the openpyxl package: pip install openpyxl")
+        else:
+            print("Import error: ", error)
+        self.select_file_button.setEnabled(True)
+        self.import_status_label.setText("Import failed, see the console for details.")
+
+    def open_statement_dialog(self):
+        options = QFileDialog.Options()
+        options |= QFileDialog.DontUseNativeDialog
+        file_name, _ = QFileDialog.getOpenFileName(self, "Select Bank Statement", "", "CSV Files (*.csv);;All Files (*)", options=options)
+        if not file_name:
+            return
+
+        # Stream the statement in on the writer thread
+        self.select_statement_button.setEnabled(False)
+        self.import_status_label.setText(f"Importing {file_name}...")
+        self.executor.submit(None, import_bank_statement, file_name, write=True,
+                             on_result=self.statement_imported, on_error=self.statement_import_failed)
+
+    def statement_imported(self, result):
+        inserted, skipped, elapsed = result
+        message = f"Imported {inserted} new transactions and skipped {skipped} already imported in {elapsed:.2f}s"
+        print(message)
+        self.select_statement_button.setEnabled(True)
+        self.import_status_label.setText(message)
+        if inserted:
+            self.transactions_changed()
+
+    def statement_import_failed(self, error):
+        # ValueErrors are mapping problems, e.g. a column the statement doesn't have
+        print("Import error: ", error)
+        self.select_statement_button.setEnabled(True)
+        self.import_status_label.setText(f"Import failed: {error}" if isinstance(error, ValueError)
+                                         else "Import failed, see the console for details.")
+
+    def transactions_changed(self):
+        # Bring the other tabs up to date after a bulk import or writes from another connection
+        if self.tab_ready(self.ENTRY_TAB):
+            # Imports can bring in new categories as well as rows
+            self.load_categories()
+            self.refresh_table()
+            self.load_budget_monitor()
+        if self.tab_ready(self.MONTHLY_TAB):
+            self.reload_month_list()
+        if self.tab_ready(self.ANALYTICS_TAB):
+            self.refresh_analytics()
+        if self.tab_ready(self.SEARCH_TAB):
+            self.run_search()
 
     def compute_total(self):
         # Iterate through each main account
@@ -235,247 +1115,320 @@ class BudgetTracker(QMainWindow):
             total_line_edit.setText(str(total))
 
     def initialize_db(self):
-        # Connect to the SQLite database
-        self.db = QSqlDatabase.addDatabase('QSQLITE')
-        self.db.setDatabaseName('budget_tracker.db')
-
-        # Open the connection
-        if not self.db.open():
-            print("Error: ", self.db.lastError().text())
-            return False
-
-        # Create a QSqlQuery object to execute SQL statements
-        query = QSqlQuery()
-
-        # Create a table if it doesn't exist
-        query.exec_("""
-            CREATE TABLE IF NOT EXISTS transactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE NOT NULL,
-                date TEXT NOT NULL,
-                category TEXT NOT NULL,
-                amount REAL NOT NULL
-        )
-        """)
-
-        # Create a table for accounting details if it doesn't exist
-        query.exec_("""
-            CREATE TABLE IF NOT EXISTS accounting_details (
-                id INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE NOT NULL,
-                date TEXT NOT NULL,
-                account_name TEXT NOT NULL,
-                checking REAL,
-                savings REAL,
-                saver REAL,
-                kiwi_saver REAL,
-                total REAL NOT NULL
-            )
-        """)
-
-        return True
-
-    def load_latest_accounting_details(self):
-        # Check if the database connection is open
-        if not self.db.isOpen():
-            if not self.db.open():
-                print("Error: ", self.db.lastError().text())
-                return
+        # Open the SQLite database on the writer thread; opening the ledger also migrates the schema.
+        # Every later query runs on a worker thread with its own connection.
+        self.executor = QueryExecutor(DEFAULT_DB_PATH, parent=self)
+        self.executor.submit(None, lambda ledger: ledger.path, write=True,
+                             on_result=self.database_opened, on_error=self.database_failed)
+
+    def check_monthly_totals(self):
+        # Verify the summary table and rebuild it if it has drifted from the transactions
+        if not self.database_ready:
+            return
+        self.statusBar().showMessage("Checking monthly totals...")
+        self.executor.submit(None, verify_and_rebuild_monthly_totals, write=True,
+                             on_result=self.monthly_totals_checked,
+                             on_error=self.monthly_totals_check_failed)
+
+    def monthly_totals_checked(self, mismatches):
+        if mismatches == 0:
+            message = "Monthly totals are up to date."
+        else:
+            message = f"Monthly totals were out of date for {mismatches} month/category rows and have been rebuilt."
+        print(message)
+        self.statusBar().showMessage(message, STATUS_MESSAGE_MS)
+        if mismatches and self.tab_ready(self.MONTHLY_TAB):
+            self.reload_month_list()
 
-        query = QSqlQuery()
+    def monthly_totals_check_failed(self, error):
+        print("Rebuild error: ", error)
+        self.statusBar().showMessage(f"Rebuilding monthly totals failed: {error}", STATUS_MESSAGE_MS)
 
+    def load_latest_accounting_details(self):
         # Fetch the latest accounting details for each main account
+        self.executor.submit("latest-accounting-details", Ledger.get_latest_accounting_details,
+                             list(self.main_accounts), on_result=self.show_latest_accounting_details)
+
+    def show_latest_accounting_details(self, latest):
         for main_account in self.main_accounts:
-            query.prepare("""
-                SELECT checking, savings, saver, kiwi_saver, total
-                FROM accounting_details
-                WHERE account_name = :account_name
-                ORDER BY date DESC
-                LIMIT 1
-            """)
-            query.bindValue(":account_name", main_account)
-            if query.exec_() and query.next():
-                # Set the values of the line edits to the fetched data
-                self.account_balance_widgets[f"{main_account} Checking"].setText(str(query.value(0)))
-                self.account_balance_widgets[f"{main_account} Savings"].setText(str(query.value(1)))
-                
-                # Only set "Saver" and "Kiwi Saver" if they exist for the account
-                if "Saver" in self.sub_accounts[main_account]:
-                    self.account_balance_widgets[f"{main_account} Saver"].setText(str(query.value(2)))
-                if "Kiwi Saver" in self.sub_accounts[main_account]:
-                    self.account_balance_widgets[f"{main_account} Kiwi Saver"].setText(str(query.value(3)))
-                
-                # Set the total balance
-                self.account_balance_widgets[f"{main_account} Total"].setText(str(query.value(4)))
-            else:
+            if main_account not in latest:
                 print(f"No accounting details found for {main_account} or failed to fetch data.")
+                continue
+            checking, savings, saver, kiwi_saver, total = latest[main_account]
+
+            # Set the values of the line edits to the fetched data
+            self.account_balance_widgets[f"{main_account} Checking"].setText(str(checking))
+            self.account_balance_widgets[f"{main_account} Savings"].setText(str(savings))
+
+            # Only set "Saver" and "Kiwi Saver" if they exist for the account
+            if "Saver" in self.sub_accounts[main_account]:
+                self.account_balance_widgets[f"{main_account} Saver"].setText(str(saver))
+            if "Kiwi Saver" in self.sub_accounts[main_account]:
+                self.account_balance_widgets[f"{main_account} Kiwi Saver"].setText(str(kiwi_saver))
+
+            # Set the total balance
+            self.account_balance_widgets[f"{main_account} Total"].setText(str(total))
 
     def save_accounting_details(self):
-        query = QSqlQuery()
+        # Snapshot every main account in one batched write
+        snapshots = {}
         for main_account in self.main_accounts:
-            # Initialize a dictionary to hold the account data
-            data = {
-                'account_name': main_account,
-                # Use Python's datetime.now() to get the current local date and time
-                'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'total': self.account_balance_widgets[f"{main_account} Total"].text()
-            }
+            balances = {'total': self.account_balance_widgets[f"{main_account} Total"].text()}
 
             # Iterate over each sub-account and safely get the text or set a default value
             for sub_account in ["Checking", "Savings", "Saver", "Kiwi Saver"]:
                 line_edit = self.account_balance_widgets.get(f"{main_account} {sub_account}")
-                data[sub_account.lower()] = line_edit.text() if line_edit is not None else '0'
-
-            # Insert the data into the database
-            query.prepare("""
-                INSERT INTO accounting_details (account_name, date, checking, savings, saver, kiwi_saver, total)
-                VALUES (:account_name, :date, :checking, :savings, :saver, :kiwi_saver, :total)
-            """)
-            # Bind the values for the INSERT
-            for key, value in data.items():
-                query.bindValue(f":{key}", value)
-            if not query.exec_():
-                print("Update error: ", query.lastError().text())
-            else:
-                print(f"Accounting details for {main_account} updated successfully.")
+                balances[sub_account.lower().replace(' ', '_')] = line_edit.text() if line_edit is not None else '0'
+            snapshots[main_account] = balances
+
+        self.executor.submit(
+            None, Ledger.save_accounting_details, snapshots, write=True,
+            on_result=self.accounting_details_saved,
+            on_error=lambda error: print("Update error: ", error),
+        )
+
+    def accounting_details_saved(self, written):
+        if written:
+            print(f"Accounting details updated for {written} of {len(self.main_accounts)} accounts.")
+        else:
+            print("Accounting details unchanged, nothing to update.")
+        if written and self.tab_ready(self.HISTORY_TAB):
+            self.load_balance_history()
+
+    def load_categories(self):
+        self.executor.submit("categories", Ledger.get_categories, on_result=self.set_categories)
+
+    def set_categories(self, categories):
+        # Refill the category combo boxes, keeping their current selections where possible
+        self.categories = categories
+        self.category_list = [name for _, name in categories]
+        if self.tab_ready(self.ENTRY_TAB):
+            for combo, items in ((self.category_input, self.category_list),
+                                 (self.category_filter_input, [ALL_CATEGORIES] + self.category_list)):
+                selected = combo.currentText()
+                combo.blockSignals(True)
+                combo.clear()
+                combo.addItems(items)
+                if selected in items:
+                    combo.setCurrentIndex(items.index(selected))
+                combo.blockSignals(False)
+            # The filtered category may have been renamed or removed
+            if self.category_filter_input.currentText() != (self.transaction_model.category_filter or ALL_CATEGORIES):
+                self.update_category_filter()
+        if self.category_manager is not None:
+            self.category_manager.set_categories(categories)
+
+    def open_category_manager(self):
+        if not self.database_ready:
+            return
+        if self.category_manager is None:
+            self.category_manager = CategoryManagerDialog(self.executor, self)
+            self.category_manager.categories_changed.connect(self.categories_changed)
+            self.category_manager.budget_changed.connect(self.budget_changed)
+        self.category_manager.set_categories(self.categories)
+        if self.budget_monitor is not None:
+            self.category_manager.set_budgets(self.budget_monitor.limits)
+        self.category_manager.show()
+        self.category_manager.raise_()
+        # The list may not have been read yet if the Item Entry tab was never opened
+        self.load_categories()
+
+    def categories_changed(self, renamed):
+        self.load_categories()
+        if not renamed:
+            return
+        # Rows only hold category ids, so a rename shows up everywhere once the views re-read them
+        if self.tab_ready(self.ENTRY_TAB):
+            self.refresh_table()
+            self.load_budget_monitor()
+        if self.tab_ready(self.MONTHLY_TAB):
+            self.update_monthly_spending_table()
+        if self.tab_ready(self.ANALYTICS_TAB):
+            self.load_analytics()
+        if self.tab_ready(self.SEARCH_TAB):
+            self.run_search()
 
     def refresh_table(self):
-        # Clear the existing table content
-        self.table.setRowCount(0)
-
-        # Execute a query to fetch the latest 10 data entries, ordered by id descending
-        query = QSqlQuery("SELECT date, category, amount FROM transactions ORDER BY id DESC LIMIT 10")
-
-        # Populate the table with the data
-        while query.next():
-            row_position = self.table.rowCount()
-            self.table.insertRow(row_position)
-            self.table.setItem(row_position, 0, QTableWidgetItem(query.value(0)))
-            self.table.setItem(row_position, 1, QTableWidgetItem(query.value(1)))
-            self.table.setItem(row_position, 2, QTableWidgetItem(str(query.value(2))))
-
-        # Reverse the order of the rows to show the most recent at the top
-        for row in range(self.table.rowCount() // 2):
-            for col in range(self.table.columnCount()):
-                top_item = self.table.takeItem(row, col)
-                bottom_row = self.table.rowCount() - row - 1
-                bottom_item = self.table.takeItem(bottom_row, col)
-                self.table.setItem(row, col, bottom_item)
-                self.table.setItem(bottom_row, col, top_item)
-
-        # Optionally, adjust column widths for better readability
-        self.table.resizeColumnsToContents()
+        # Reload the transaction history from its first page
+        self.transaction_model.refresh()
+
+    def history_sort_changed(self, column, order):
+        # Put the indicator back when a column that can't be sorted is clicked
+        model = self.transaction_model
+        if (column, order) != (model.sort_column, model.sort_order):
+            self.table.horizontalHeader().setSortIndicator(model.sort_column, model.sort_order)
+
+    def update_category_filter(self):
+        category = self.category_filter_input.currentText()
+        self.transaction_model.set_category_filter(None if category == ALL_CATEGORIES else category)
 
     def add_transaction_from_input(self):
         # Get input values
-        date = self.date_input.date().toString('dd-MMM-yy')
+        date = self.date_input.date().toString(QT_DB_DATE_FORMAT)
         expenditure_type = self.category_input.currentText()
         amount = self.amount_input.text()
+        memo = self.memo_input.text()
 
         # Add transaction to the table
-        self.add_transaction(date, expenditure_type, amount)
+        self.add_transaction(date, expenditure_type, amount, memo)
 
         # Clear input fields
         self.amount_input.clear()
+        self.memo_input.clear()
+
+    def add_transaction(self, date, category, amount, memo=None):
+        # Insert one transaction on the writer thread; transaction_added runs once it is stored
+        self.executor.submit(None, add_and_fetch_transaction, date, category, amount, memo, write=True,
+                             on_result=self.transaction_added,
+                             on_error=lambda error: print("Error: ", error))
+
+    def transaction_added(self, row):
+        # Add the month to the month list if it starts a new one.
+        # An unopened Monthly Accounts tab will read the month list fresh when it is built.
+        if self.tab_ready(self.MONTHLY_TAB):
+            self.add_month_to_list(row[1][:7])
+        # Show the new row in the history without reloading it, and count it against its budget
+        if self.tab_ready(self.ENTRY_TAB):
+            self.transaction_model.insert_transaction(row)
+            self.transaction_budgeted(row)
+        # The analytics cache reads the new row, and any committed before it by other clients, past its
+        # last id; appending the row directly would move that id past rows it has never seen
+        if self.analytics_columns is not None or self.analytics_reading:
+            self.refresh_analytics()
+
+    def load_budget_monitor(self):
+        # Seed the running totals on the writer thread, so they include every insert submitted before
+        # and every later insert is counted by transaction_added
+        self.executor.submit("budget-monitor", BudgetMonitor.load, write=True,
+                             on_result=self.budget_monitor_loaded,
+                             on_error=lambda error: print("Budget error: ", error))
+
+    def budget_monitor_loaded(self, monitor):
+        self.budget_monitor = monitor
+        if self.category_manager is not None:
+            self.category_manager.set_budgets(monitor.limits)
+        self.show_budget_status()
+
+    def budget_changed(self, category, limit):
+        # Only the limit changed, so the month's running totals stay as they are. Without a monitor
+        # there is nothing to update: it is seeded from the budgets table once the Item Entry tab opens.
+        if self.budget_monitor is None:
+            return
+        self.budget_monitor.set_limit(category, limit)
+        self.show_budget_status()
 
-        # Refresh the table view
-        self.refresh_table()  # Call the refresh method
-
-    def add_transaction(self, date, category, amount):
-        # Create a QSqlQuery object
-        query = QSqlQuery()
-
-        # Prepare the insert SQL statement
-        query.prepare("INSERT INTO transactions (date, category, amount) VALUES (?, ?, ?)")
-
-        # Bind the values to the placeholders
-        query.addBindValue(date)
-        query.addBindValue(category)
-        query.addBindValue(amount)
-
-        # Execute the query
-        if not query.exec_():
-            print("Error: ", query.lastError().text())
+    def transaction_budgeted(self, row):
+        if self.budget_monitor is None:
+            return
+        _, row_date, category, amount, _ = row
+        status = self.budget_monitor.record(row_date, category, amount)
+        if row_date[:7] != self.budget_monitor.month:
+            return
+        if status['state'] == 'over':
+            print(f"Warning: {category} is over its monthly budget by {-status['remaining']:.2f}")
+        self.show_budget_status(category=category)
+
+    def show_budget_status(self, *_, category=None):
+        # Everything comes from the in-memory totals; nothing is queried per keystroke or submit
+        monitor = self.budget_monitor
+        if monitor is None:
+            return
+        if monitor.month != QDate.currentDate().toString('yyyy-MM'):
+            # A new month has started since the totals were seeded
+            self.budget_monitor = None
+            self.load_budget_monitor()
+            return
+        category = category or self.category_input.currentText()
+        if not category:
+            self.budget_status_label.setText("")
+            return
+        pending = self.amount_input.text() if category == self.category_input.currentText() else 0
+        status = monitor.status(category, pending)
+        if status['state'] == 'none':
+            text = f"{category}: {status['spent']:.2f} spent this month, no budget set"
+        elif status['state'] == 'over':
+            text = f"{category}: over budget by {-status['remaining']:.2f} (budget {status['limit']:.2f} a month)"
+        else:
+            text = f"{category}: {status['remaining']:.2f} of {status['limit']:.2f} left this month"
+        if parse_amount(pending):
+            text += " after this entry"
+        self.budget_status_label.setText(text)
+        color = BUDGET_STATE_COLORS.get(status['state'])
+        self.budget_status_label.setStyleSheet(f"color: {color}" if color else "")
 
     # Add the new methods for the third tab functionality here
-    def get_month_list(self):
-
-        if not self.db.isOpen():
-            if not self.db.open():
-                print("Error: ", self.db.lastError().text())
-                return []
-
-        month_list = []
-        query = QSqlQuery(self.db)
-
-        # Execute a simple query to fetch all dates
-        if query.exec_("SELECT DISTINCT date FROM transactions"):
-            while query.next():
-                # Fetch the date as a string from the database
-                date_str = query.value(0)
-                # Convert the date string to a datetime object
-                try:
-                    date_obj = datetime.strptime(date_str, '%d-%b-%y')
-                    # Format the date as 'YYYY-MM' and add to the list if not already present
-                    month_year_str = date_obj.strftime('%Y-%m')
-                    if month_year_str not in month_list:
-                        month_list.append(month_year_str)
-                except ValueError as e:
-                    print(f"Date conversion error: {e}")
+    def add_month_to_list(self, month):
+        # Insert a newly seen 'YYYY-MM' month into the combo box at its sorted position
+        index = bisect.bisect_left(self.month_keys, month)
+        if index < len(self.month_keys) and self.month_keys[index] == month:
+            return
+        label = format_month_label(month)
+        if label is None:
+            return
+        self.month_keys.insert(index, month)
+        self.month_list.insert(index, label)
+        self.month_input.insertItem(index, label)
 
-        else:
-            error = query.lastError().text()
-            print(f"Query failed: {error}")
-        
-        # At the end of your get_month_list function, before returning the list
-        formatted_month_list = []
-        for month_year_str in month_list:
-            # Convert 'YYYY-MM' to 'MMM-YYYY'
-            date_obj = datetime.strptime(month_year_str, '%Y-%m')
-            formatted_month_list.append(date_obj.strftime('%b-%Y'))
-
-        return formatted_month_list
+    def reload_month_list(self):
+        # Read the sorted 'YYYY-MM' keys of the months that have data
+        self.executor.submit("month-list", Ledger.get_month_keys, on_result=self.set_month_keys)
+
+    def set_month_keys(self, month_keys):
+        # Rebuild the month combo box, keeping the current selection where possible
+        selected_month_year = self.month_input.currentText()
+        self.month_keys = month_keys
+        self.month_list = [format_month_label(month) for month in self.month_keys]
+        self.month_input.blockSignals(True)
+        self.month_input.clear()
+        self.month_input.addItems(self.month_list)
+        if selected_month_year in self.month_list:
+            self.month_input.setCurrentIndex(self.month_list.index(selected_month_year))
+        self.month_input.blockSignals(False)
+        self.update_monthly_spending_table()
 
     def update_monthly_spending_table(self):
         selected_month_year = self.month_input.currentText()
+        if not selected_month_year:
+            # No months with data yet
+            self.monthly_spending_table.setRowCount(0)
+            return
 
         try:
             # Convert the selected month-year string to datetime object
             selected_date = datetime.strptime(selected_month_year, '%b-%Y')
-            # Format the selected date to match the database format 'MMM-YY'
-            formatted_selected_date = selected_date.strftime('%b-%y')
-
-            # Prepare the SQL query to sum up spending by category for the selected month
-            query_str = f"""
-                SELECT category, SUM(amount) 
-                FROM transactions 
-                WHERE date LIKE '%{formatted_selected_date}' 
-                GROUP BY category
-            """
-            query = QSqlQuery(self.db)
-            if query.exec_(query_str):
-                # Clear the table before inserting new data
-                self.monthly_spending_table.setRowCount(0)
-                row = 0
-                while query.next():
-                    # Insert new rows into the table for each category
-                    self.monthly_spending_table.insertRow(row)
-                    # Category
-                    self.monthly_spending_table.setItem(row, 0, QTableWidgetItem(query.value(0)))
-                    # Summed amount
-                    self.monthly_spending_table.setItem(row, 1, QTableWidgetItem(str(query.value(1))))
-                    row += 1
-            else:
-                error = query.lastError().text()
-                # Handle any errors appropriately
         except ValueError as e:
             # Handle any date conversion errors appropriately
-            print(f"Something failed")
+            print(f"Invalid month selection {selected_month_year!r}: {e}")
+            return
+
+        # Read the precomputed per-category totals for the selected month.
+        # Flicking through months quickly supersedes the earlier reads, so only the last one is shown.
+        self.executor.submit("monthly-totals", Ledger.get_monthly_totals, selected_date.strftime('%Y-%m'),
+                             on_result=self.show_monthly_spending)
+
+    def show_monthly_spending(self, spending):
+        # Clear the table before inserting new data
+        self.monthly_spending_table.setRowCount(0)
+        for row, (category, total) in enumerate(spending):
+            # Insert new rows into the table for each category
+            self.monthly_spending_table.insertRow(row)
+            # Category
+            self.monthly_spending_table.setItem(row, 0, QTableWidgetItem(category))
+            # Summed amount
+            self.monthly_spending_table.setItem(row, 1, QTableWidgetItem(str(total)))
 
     def closeEvent(self, event):
-         self.db.close()
+        # Let pending writes finish, then close every worker connection
+        self.data_version_timer.stop()
+        if self.executor is not None:
+            self.executor.shutdown()
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    window = BudgetTracker()
+    startup_timer.record("Imports", IMPORTS_FINISHED - STARTUP_STARTED)
+    with startup_timer.measure("QApplication"):
+        app = QApplication(sys.argv)
+    with startup_timer.measure("Main window"):
+        window = BudgetTracker()
     window.show()
     sys.exit(app.exec_())
 
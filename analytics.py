@@ -0,0 +1,215 @@
+# Spending trends computed from an in-memory columnar copy of the transactions table.
+# The table is read once into NumPy arrays (day numbers, category codes, amounts) and
+# new rows are appended as they are added, so every trend view is a handful of array
+# operations over the whole history instead of a round of SQL queries.
+# Needs numpy (pip install numpy); the GUI and CLI only import this module on first use.
+import calendar
+import itertools
+from datetime import date
+
+import numpy as np
+
+# Rows converted per batch while loading the table
+LOAD_BATCH_SIZE = 50000
+ROLLING_WINDOWS = (3, 12)
+
+
+def parse_days(dates):
+    # ISO 'YYYY-MM-DD' strings to day numbers since 1970-01-01; unparseable dates become NaT
+    try:
+        return np.array(dates, dtype='datetime64[D]')
+    except ValueError:
+        days = np.empty(len(dates), dtype='datetime64[D]')
+        for index, value in enumerate(dates):
+            try:
+                days[index] = np.datetime64(value, 'D')
+            except (TypeError, ValueError):
+                days[index] = np.datetime64('NaT')
+        return days
+
+
+def parse_amounts(amounts):
+    # Amounts as float64; text that isn't a number counts as 0, the same as the monthly totals triggers
+    try:
+        return np.array(amounts, dtype=np.float64)
+    except (TypeError, ValueError):
+        parsed = np.zeros(len(amounts), dtype=np.float64)
+        for index, value in enumerate(amounts):
+            try:
+                parsed[index] = float(value)
+            except (TypeError, ValueError):
+                continue
+        return parsed
+
+
+def month_numbers(days):
+    # Months since 1970-01 for day numbers since 1970-01-01
+    return days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+
+class TransactionColumns:
+    # The transactions table as parallel arrays. Arrays grow by doubling, so appending one row at a time
+    # stays cheap; only the first `size` entries are live.
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self):
+        self.days = np.empty(self.INITIAL_CAPACITY, dtype=np.int32)     # days since 1970-01-01
+        self.codes = np.empty(self.INITIAL_CAPACITY, dtype=np.int16)    # index into self.categories
+        self.amounts = np.empty(self.INITIAL_CAPACITY, dtype=np.float64)
+        self.size = 0
+        self.categories = []
+        self.category_codes = {}
+        # Highest transaction id seen, so rows that were already loaded are never appended twice
+        self.last_id = 0
+        self.skipped = 0  # rows whose date could not be parsed
+
+    @classmethod
+    def load(cls, ledger):
+        # Read the whole transactions table in batches
+        columns = cls()
+        rows = ledger.iter_transaction_rows(include_archives=True)
+        while True:
+            batch = list(itertools.islice(rows, LOAD_BATCH_SIZE))
+            if not batch:
+                break
+            # Ids are only ordered within each file, so every row is taken while loading
+            columns.add_rows(batch)
+        return columns
+
+    def __len__(self):
+        return self.size
+
+    def extend(self, rows):
+        # Add (id, date, category, amount) rows with ids after last_id; returns the number added
+        return self.add_rows([row for row in rows if row[0] > self.last_id])
+
+    def add_rows(self, rows):
+        if not rows:
+            return 0
+        ids, dates, categories, amounts = zip(*rows)
+        self.last_id = max(self.last_id, max(ids))
+
+        days = parse_days(dates)
+        valid = ~np.isnat(days)
+        self.skipped += int(len(rows) - valid.sum())
+        codes = np.fromiter((self.category_code(category) for category in categories), dtype=np.int16,
+                            count=len(rows))
+
+        days = days[valid].astype(np.int64).astype(np.int32)
+        count = len(days)
+        self.reserve(self.size + count)
+        self.days[self.size:self.size + count] = days
+        self.codes[self.size:self.size + count] = codes[valid]
+        self.amounts[self.size:self.size + count] = parse_amounts(amounts)[valid]
+        self.size += count
+        return count
+
+    def category_code(self, category):
+        code = self.category_codes.get(category)
+        if code is None:
+            code = self.category_codes[category] = len(self.categories)
+            self.categories.append(category)
+        return code
+
+    def reserve(self, capacity):
+        if capacity <= len(self.days):
+            return
+        capacity = max(capacity, 2 * len(self.days))
+        for name in ('days', 'codes', 'amounts'):
+            old = getattr(self, name)
+            grown = np.empty(capacity, dtype=old.dtype)
+            grown[:self.size] = old[:self.size]
+            setattr(self, name, grown)
+
+    def live(self):
+        # Views of the filled part of each array
+        return self.days[:self.size], self.codes[:self.size], self.amounts[:self.size]
+
+
+def monthly_matrix(columns, last_day=None):
+    # (first month number, matrix[category code, month]) of spending per category per month,
+    # counting only days up to last_day. None if there is nothing to count.
+    days, codes, amounts = columns.live()
+    if last_day is not None:
+        keep = days <= last_day
+        days, codes, amounts = days[keep], codes[keep], amounts[keep]
+    if len(days) == 0:
+        return None
+    months = month_numbers(days)
+    first = int(months.min())
+    span = int(months.max()) - first + 1
+    cells = codes.astype(np.int64) * span + (months - first)
+    matrix = np.bincount(cells, weights=amounts, minlength=len(columns.categories) * span)
+    return first, matrix.reshape(len(columns.categories), span)
+
+
+def trailing_sums(matrix, window):
+    # Sum of each month and the window - 1 months before it, and how many months that covered
+    months = matrix.shape[1]
+    cumulative = np.zeros((matrix.shape[0], months + 1))
+    np.cumsum(matrix, axis=1, out=cumulative[:, 1:])
+    ends = np.arange(1, months + 1)
+    starts = np.maximum(ends - window, 0)
+    return cumulative[:, ends] - cumulative[:, starts], ends - starts
+
+
+def rolling_mean(matrix, window):
+    # Trailing window-month average for every category and month.
+    # The first months average however many months there are so far.
+    sums, covered = trailing_sums(matrix, window)
+    return sums / covered
+
+
+def year_over_year(matrix):
+    # Last 12 months' spending minus the 12 months before, for every category and month.
+    # NaN until there are two full years to compare.
+    sums, _ = trailing_sums(matrix, 12)
+    deltas = np.full(matrix.shape, np.nan)
+    if matrix.shape[1] >= 24:
+        deltas[:, 23:] = sums[:, 23:] - sums[:, 11:-12]
+    return deltas
+
+
+def category_summary(columns, as_of=None):
+    # Per-category trends as of a day (a date, default the latest transaction), sorted by category.
+    # Averages and year-over-year figures cover complete months before as_of's month; the forecast
+    # projects as_of's month to its end at the pace spent so far.
+    days, _, _ = columns.live()
+    if len(days) == 0:
+        return {'as_of': None, 'categories': []}
+    last_day = int(days.max()) if as_of is None else int(np.datetime64(as_of, 'D').astype(np.int64))
+    counted = monthly_matrix(columns, None if as_of is None else last_day)
+    if counted is None:
+        return {'as_of': as_of, 'categories': []}
+    first_month, matrix = counted
+
+    as_of = date.fromordinal(date(1970, 1, 1).toordinal() + last_day)
+    current = (as_of.year - 1970) * 12 + as_of.month - 1 - first_month
+    # Pad out to as_of's month when it has no spending yet
+    if current >= matrix.shape[1]:
+        matrix = np.pad(matrix, ((0, 0), (0, current + 1 - matrix.shape[1])))
+    days_in_month = calendar.monthrange(as_of.year, as_of.month)[1]
+
+    month_to_date = matrix[:, current]
+    forecast = month_to_date / as_of.day * days_in_month
+    previous = current - 1
+    averages = {window: rolling_mean(matrix, window)[:, previous] if previous >= 0
+                else np.full(matrix.shape[0], np.nan) for window in ROLLING_WINDOWS}
+    last_12, _ = trailing_sums(matrix, 12)
+    last_12 = last_12[:, previous] if previous >= 0 else np.zeros(matrix.shape[0])
+    yoy = year_over_year(matrix)[:, previous] if previous >= 0 else np.full(matrix.shape[0], np.nan)
+
+    rows = []
+    for code in sorted(range(len(columns.categories)), key=lambda code: columns.categories[code]):
+        prior_12 = last_12[code] - yoy[code]
+        rows.append({
+            'category': columns.categories[code],
+            'month_to_date': float(month_to_date[code]),
+            'forecast': float(forecast[code]),
+            'average_3': float(averages[3][code]),
+            'average_12': float(averages[12][code]),
+            'last_12': float(last_12[code]),
+            'yoy_delta': float(yoy[code]),
+            'yoy_percent': float(yoy[code] / prior_12 * 100) if prior_12 else float('nan'),
+        })
+    return {'as_of': as_of, 'categories': rows}
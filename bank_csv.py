@@ -0,0 +1,211 @@
+# Streaming reader for bank statement CSV exports.
+# A mapping says which columns hold the date, amount, memo and (optionally) category,
+# and category rules pick a category from the memo text. Every line also gets a hash of
+# its contents, which the ledger stores under a unique index so re-importing an
+# overlapping statement skips the rows it already has.
+#
+# Mappings are JSON files; any key left out keeps its DEFAULT_MAPPING value:
+#
+#   {
+#     "date": "Transaction Date", "date_formats": ["%d/%m/%Y"],
+#     "amount": "Amount",                      or "debit": "Debit", "credit": "Credit"
+#     "memo": ["Payee", "Particulars"],
+#     "category": null, "default_category": "General",
+#     "amount_sign": "negate",                 "negate", "as_is" or "absolute"
+#     "rules": [{"match": "countdown", "category": "Food"}, {"regex": "^Z ", "category": "Car"}]
+#   }
+#
+# Columns are header names, or 0-based positions for files without a header row.
+# One date format is used for a whole file: the only one of date_formats that reads every dated
+# line so far. Lines are held back until that is settled, so a statement never mixes day-first and
+# month-first readings; a file whose dates fit several formats throughout gets the first of them.
+import csv
+import hashlib
+import json
+import re
+from datetime import datetime
+
+from ledger import DB_DATE_FORMAT
+
+DEFAULT_MAPPING = {
+    'delimiter': ',',
+    'encoding': 'utf-8-sig',   # strips the byte order mark some banks write
+    'skip_lines': 0,           # preamble lines before the header
+    'has_header': True,
+    'date': 'Date',
+    # Candidates for a file's date format; day-first comes before month-first
+    'date_formats': ['%Y-%m-%d', '%d/%m/%Y', '%d/%m/%y', '%m/%d/%Y', '%d-%m-%Y', '%d %b %Y', '%d-%b-%y'],
+    'amount': 'Amount',
+    'debit': None,
+    'credit': None,
+    # The ledger counts spending as positive, while statements show debits as negative amounts, so
+    # by default amounts are negated: purchases add to their category and refunds and other credits
+    # take away from it. "as_is" suits statements that show debits as positive; "absolute" counts
+    # every line, credits included, as spending.
+    'amount_sign': 'negate',
+    'memo': ['Description'],
+    'category': None,
+    'default_category': 'General',
+    'rules': [],
+}
+AMOUNT_SIGNS = ('negate', 'as_is', 'absolute')
+# Most lines held back while several date formats still fit; past this the first of them is used
+MAX_UNDECIDED_LINES = 1000
+
+
+def load_mapping(path=None):
+    # DEFAULT_MAPPING overlaid with a JSON mapping file, if one is given
+    mapping = dict(DEFAULT_MAPPING)
+    if path is not None:
+        with open(path, encoding='utf-8') as mapping_file:
+            overrides = json.load(mapping_file)
+        unknown = set(overrides) - set(DEFAULT_MAPPING)
+        if unknown:
+            raise ValueError(f"Unknown mapping keys: {', '.join(sorted(unknown))}")
+        mapping.update(overrides)
+    if isinstance(mapping['memo'], (str, int)):
+        mapping['memo'] = [mapping['memo']]
+    if mapping['amount_sign'] not in AMOUNT_SIGNS:
+        raise ValueError(f"amount_sign must be one of {', '.join(AMOUNT_SIGNS)}")
+    return mapping
+
+
+def compile_rules(rules):
+    # (compiled pattern, category) pairs; "match" is a case-insensitive substring, "regex" a regular expression
+    compiled = []
+    for rule in rules:
+        if 'regex' in rule:
+            pattern = re.compile(rule['regex'], re.IGNORECASE)
+        elif 'match' in rule:
+            pattern = re.compile(re.escape(rule['match']), re.IGNORECASE)
+        else:
+            raise ValueError(f"Category rule needs 'match' or 'regex': {rule!r}")
+        compiled.append((pattern, rule['category']))
+    return compiled
+
+
+def parse_amount(value):
+    # Bank amounts as floats: currency symbols and thousands separators are dropped, (12.50) is negative
+    text = str(value).strip()
+    if not text:
+        return None
+    negative = text.startswith('(') and text.endswith(')')
+    text = re.sub(r"[^0-9.+-]", "", text)
+    try:
+        amount = float(text)
+    except ValueError:
+        return None
+    return -amount if negative else amount
+
+
+def parse_date(value, date_format):
+    # An ISO date, or None if the value isn't in date_format
+    try:
+        return datetime.strptime(str(value).strip(), date_format).strftime(DB_DATE_FORMAT)
+    except ValueError:
+        return None
+
+
+def line_content(fields):
+    # A statement line's fields, normalised, as one string
+    return "\x1f".join(field.strip() for field in fields)
+
+
+def line_hash(content, occurrence):
+    # Identity of a statement line: its content plus how many identical lines came before it in the
+    # same file, so two genuine identical purchases on one day are both kept
+    return hashlib.blake2b(f"{content}\x1e{occurrence}".encode('utf-8'), digest_size=16).digest()
+
+
+def read_bank_csv(lines, mapping):
+    # Stream (date, category, amount, memo, import_hash) rows out of an iterable of CSV text lines
+    rows = csv.reader(lines, delimiter=mapping['delimiter'])
+    for _ in range(mapping['skip_lines']):
+        next(rows, None)
+    header = next(rows, None) if mapping['has_header'] else None
+    if mapping['has_header'] and header is None:
+        return
+
+    def column_index(column):
+        if column is None or isinstance(column, int):
+            return column
+        names = [name.strip().lower() for name in header or []]
+        if column.strip().lower() not in names:
+            raise ValueError(f"Column {column!r} is not in the CSV header")
+        return names.index(column.strip().lower())
+
+    date_column = column_index(mapping['date'])
+    if mapping['debit'] is not None or mapping['credit'] is not None:
+        amount_columns = [(column_index(mapping['debit']), -1), (column_index(mapping['credit']), 1)]
+    else:
+        amount_columns = [(column_index(mapping['amount']), 1)]
+    memo_columns = [column_index(column) for column in mapping['memo']]
+    category_column = column_index(mapping['category'])
+    rules = compile_rules(mapping['rules'])
+
+    def field(fields, column):
+        return fields[column].strip() if column is not None and column < len(fields) else ""
+
+    occurrences = {}
+    # Statements repeat the same few dates many times, so each distinct date string is only parsed once
+    parsed_dates = {}
+
+    def statement_row(line_number, fields, date_format):
+        # (date, category, amount, memo, import_hash) for a line, or None if it can't be imported
+        date_text = field(fields, date_column)
+        row_date = parsed_dates.get(date_text)
+        if row_date is None and date_text not in parsed_dates:
+            row_date = parsed_dates[date_text] = parse_date(date_text, date_format)
+        if row_date is None and date_text:
+            print(f"Skipping line {line_number}: date {date_text!r} isn't in the statement's {date_format} format")
+            return None
+        amount = None
+        for column, sign in amount_columns:
+            value = parse_amount(field(fields, column))
+            if value:
+                amount = sign * abs(value) if len(amount_columns) > 1 else value
+        if row_date is None or amount is None:
+            print(f"Skipping line {line_number}: no date or amount in {fields!r}")
+            return None
+        if mapping['amount_sign'] == 'absolute':
+            amount = abs(amount)
+        elif mapping['amount_sign'] == 'negate':
+            amount = -amount
+
+        memo = " ".join(value for value in (field(fields, column) for column in memo_columns) if value)
+        category = next((name for pattern, name in rules if pattern.search(memo)), None)
+        category = category or field(fields, category_column) or mapping['default_category']
+
+        content = line_content(fields)
+        occurrence = occurrences.get(content, 0)
+        occurrences[content] = occurrence + 1
+        return row_date, category, amount, memo, line_hash(content, occurrence)
+
+    # Formats that read every dated line so far, and the lines waiting for them to come down to one
+    date_formats = list(mapping['date_formats'])
+    undecided = []
+    for line_number, fields in enumerate(rows, start=mapping['skip_lines'] + (2 if header else 1)):
+        if not any(value.strip() for value in fields):
+            continue
+        if len(date_formats) > 1:
+            date_text = field(fields, date_column)
+            fitting = [date_format for date_format in date_formats if parse_date(date_text, date_format)]
+            if not fitting:
+                print(f"Skipping line {line_number}: no readable date in {fields!r}")
+                continue
+            date_formats = fitting
+            undecided.append((line_number, fields))
+            if len(date_formats) > 1 and len(undecided) < MAX_UNDECIDED_LINES:
+                continue
+            lines, undecided = undecided, []
+        else:
+            lines = [(line_number, fields)]
+        for waiting_line_number, waiting_fields in lines:
+            row = statement_row(waiting_line_number, waiting_fields, date_formats[0])
+            if row is not None:
+                yield row
+    # Dates that fit several formats all the way through are read with the first of them
+    for waiting_line_number, waiting_fields in undecided:
+        row = statement_row(waiting_line_number, waiting_fields, date_formats[0])
+        if row is not None:
+            yield row
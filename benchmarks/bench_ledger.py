@@ -0,0 +1,256 @@
+# Times the ledger operations behind the app's hot paths on a synthetic database
+# and writes the results as JSON, so runs can be diffed across schema changes.
+#
+#   python benchmarks/bench_ledger.py --rows 1000000 --output results.json
+#   python benchmarks/bench_ledger.py --db existing.db --skip-generate
+#
+# Hot path           GUI entry point                      Ledger call timed here
+# add_transaction    add_transaction_from_input            add_transaction
+# refresh_table      history model first page / scrolling  fetch_transactions_page
+# get_month_list     Monthly Accounts month combo          get_month_keys
+# monthly_spending   update_monthly_spending_table         get_monthly_totals
+# latest_balances    load_latest_accounting_details        get_latest_accounting_details
+# excel_import       open_file_dialog                      import_excel
+# csv_import         open_statement_dialog                 import_bank_csv (first import, then a re-import)
+import argparse
+import csv
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from ledger import Ledger, SCHEMA_VERSION  # noqa: E402
+from synthetic_ledger import build_database, category_names, account_names  # noqa: E402
+
+
+def summarize(samples):
+    # Millisecond statistics for a list of durations in seconds
+    ordered = sorted(samples)
+    return {
+        'runs': len(ordered),
+        'min_ms': ordered[0] * 1000,
+        'median_ms': statistics.median(ordered) * 1000,
+        'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        'max_ms': ordered[-1] * 1000,
+    }
+
+
+def time_calls(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def bench_add_transaction(ledger, repeat):
+    # Single-row inserts as the entry form does them, each its own committed transaction
+    return time_calls(lambda: ledger.add_transaction('2099-12-31', 'Benchmark', 1.0), repeat)
+
+
+def bench_refresh_table(ledger, repeat, pages=10):
+    results = {'first_page': time_calls(lambda: ledger.fetch_transactions_page(limit=200), repeat)}
+
+    # Scrolling: each page continues from the last row of the previous one
+    def scroll():
+        last_row = None
+        for _ in range(pages):
+            page = ledger.fetch_transactions_page(last_row=last_row, limit=200)
+            if not page:
+                break
+            last_row = page[-1]
+    results[f'scroll_{pages}_pages'] = time_calls(scroll, repeat)
+    results['first_page_by_category'] = time_calls(
+        lambda: ledger.fetch_transactions_page(sort_column='amount', category='Food', limit=200), repeat)
+    return results
+
+
+def bench_monthly_spending(ledger, months, repeat):
+    # Switching the month combo across the whole history
+    samples = []
+    for _ in range(repeat):
+        for month in months:
+            started = time.perf_counter()
+            ledger.get_monthly_totals(month)
+            samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def build_excel_workbook(path, years, categories, start_year):
+    # A category-by-month workbook shaped like the one the Excel Input tab expects
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(["Category"] + [f"{year}-{month:02d}" for year in range(start_year, start_year + years)
+                                 for month in range(1, 13)])
+    for index, category in enumerate(category_names(categories)):
+        sheet.append([category] + [float(index + month) for month in range(years * 12)])
+    workbook.save(path)
+
+
+def bench_excel_import(db_path, workdir, years, categories, start_year, repeat):
+    try:
+        build_excel_workbook(os.path.join(workdir, 'bench.xlsx'), years, categories, start_year)
+    except ImportError:
+        return {'skipped': "openpyxl is not installed"}
+
+    samples, imported = [], 0
+    for run in range(repeat):
+        # Import into a fresh copy each time so every run sees the same table size
+        copy_path = os.path.join(workdir, f'import_{run}.db')
+        shutil.copyfile(db_path, copy_path)
+        with Ledger(copy_path) as ledger:
+            imported, elapsed = ledger.import_excel(os.path.join(workdir, 'bench.xlsx'))
+        samples.append(elapsed)
+        os.remove(copy_path)
+    result = summarize(samples)
+    result['rows'] = imported
+    result['rows_per_sec'] = imported / statistics.median(samples) if imported else 0
+    return result
+
+
+def build_statement_csv(path, rows, seed):
+    # A bank statement shaped like the default bank_csv mapping expects, one line per transaction
+    from synthetic_ledger import generate_transactions
+
+    with open(path, 'w', newline='') as statement:
+        writer = csv.writer(statement)
+        writer.writerow(["Date", "Description", "Amount", "Balance"])
+        balance = 0.0
+        for row_date, category, amount in generate_transactions(max(1, rows // 12000), 21, rows, 2000, seed):
+            balance -= amount
+            writer.writerow([row_date, f"{category.upper()} PAYMENT", f"-{amount:.2f}", f"{balance:.2f}"])
+
+
+def bench_csv_import(db_path, workdir, rows, seed):
+    # Import a statement into a copy of the database, then import it again; the second run skips every line
+    statement_path = os.path.join(workdir, 'statement.csv')
+    build_statement_csv(statement_path, rows, seed)
+    copy_path = os.path.join(workdir, 'csv_import.db')
+    shutil.copyfile(db_path, copy_path)
+    result = {}
+    with Ledger(copy_path) as ledger:
+        for run in ('first', 'repeat'):
+            inserted, skipped, elapsed = ledger.import_bank_csv(statement_path)
+            result[run] = {'seconds': elapsed, 'inserted': inserted, 'skipped': skipped,
+                           'rows_per_sec': (inserted + skipped) / elapsed if elapsed else 0}
+    os.remove(copy_path)
+    return result
+
+
+def run_benchmarks(args, workdir):
+    db_path = args.db or os.path.join(workdir, 'bench.db')
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'schema_version': SCHEMA_VERSION,
+            'parameters': {
+                'years': args.years, 'categories': args.categories, 'rows': args.rows,
+                'accounts': args.accounts, 'snapshots': args.snapshots,
+                'start_year': args.start_year, 'seed': args.seed, 'repeat': args.repeat,
+            },
+        },
+        'results': {},
+    }
+    results = report['results']
+
+    if not args.skip_generate:
+        stats = build_database(db_path, args.years, args.categories, args.rows, args.accounts, args.snapshots,
+                               args.start_year, args.seed)
+        results['generate'] = {
+            'transactions': stats['transactions'],
+            'seconds': stats['transactions_seconds'],
+            'rows_per_sec': stats['transactions'] / stats['transactions_seconds'] if stats['transactions_seconds'] else 0,
+        }
+
+    # Copy the database so the write benchmarks never change the generated or supplied file
+    work_db = os.path.join(workdir, 'work.db')
+    shutil.copyfile(db_path, work_db)
+    report['meta']['database_bytes'] = os.path.getsize(work_db)
+
+    started = time.perf_counter()
+    ledger = Ledger(work_db).open()
+    results['open'] = {'seconds': time.perf_counter() - started}
+    try:
+        report['meta']['transactions'] = ledger.query_one("SELECT COUNT(*) FROM transactions")[0]
+        results['get_month_list'] = time_calls(ledger.get_month_keys, args.repeat)
+        months = ledger.get_month_keys()
+        results['monthly_spending'] = bench_monthly_spending(ledger, months, max(1, args.repeat // 10))
+        results['refresh_table'] = bench_refresh_table(ledger, args.repeat)
+        results['latest_balances'] = time_calls(
+            lambda: ledger.get_latest_accounting_details(account_names(args.accounts)), args.repeat)
+        results['add_transaction'] = bench_add_transaction(ledger, args.repeat)
+    finally:
+        ledger.close()
+
+    if args.csv_rows:
+        results['csv_import'] = bench_csv_import(db_path, workdir, args.csv_rows, args.seed)
+
+    if not args.skip_excel:
+        results['excel_import'] = bench_excel_import(db_path, workdir, args.years, args.categories,
+                                                     args.start_year, max(1, args.repeat // 10))
+    return report
+
+
+def print_summary(report):
+    for name, result in report['results'].items():
+        entries = result.items() if all(isinstance(v, dict) for v in result.values()) else [(None, result)]
+        for variant, stats in entries:
+            label = f"{name}.{variant}" if variant else name
+            if 'median_ms' in stats:
+                print(f"{label:<40} median {stats['median_ms']:>9.3f} ms   p95 {stats['p95_ms']:>9.3f} ms",
+                      file=sys.stderr)
+            elif 'seconds' in stats:
+                print(f"{label:<40} {stats['seconds']:>9.3f} s", file=sys.stderr)
+            else:
+                print(f"{label:<40} {stats}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the budget tracker ledger on synthetic data")
+    parser.add_argument('--db', help="generate into this file instead of a temporary one")
+    parser.add_argument('--skip-generate', action='store_true',
+                        help="benchmark the existing --db as is (it is copied, never modified)")
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--categories', type=int, default=21)
+    parser.add_argument('--rows', type=int, default=100000, help="total transactions to generate")
+    parser.add_argument('--accounts', type=int, default=3)
+    parser.add_argument('--snapshots', type=int, default=520, help="balance snapshots per account")
+    parser.add_argument('--start-year', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=50, help="timed runs per operation")
+    parser.add_argument('--skip-excel', action='store_true', help="don't time the Excel import")
+    parser.add_argument('--csv-rows', type=int, default=50000, help="bank statement lines to import (0 to skip)")
+    parser.add_argument('-o', '--output', default='-', help="JSON results file (default: stdout)")
+    args = parser.parse_args(argv)
+    if args.skip_generate and not args.db:
+        parser.error("--skip-generate needs --db")
+
+    workdir = tempfile.mkdtemp(prefix='budget-bench-')
+    try:
+        report = run_benchmarks(args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_summary(report)
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# Deterministic synthetic budget_tracker databases for benchmarking.
+# The same arguments and seed always produce the same rows, so timings from
+# different schema versions or machines can be compared like for like.
+#
+#   python benchmarks/synthetic_ledger.py bench.db --years 10 --categories 30 --rows 1000000
+import argparse
+import calendar
+import os
+import random
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from ledger import Ledger, DB_DATE_FORMAT, DEFAULT_CATEGORIES  # noqa: E402
+
+BASE_ACCOUNTS = ["Acoount1", "Acoount2", "Acoount3"]
+
+
+def category_names(count):
+    # The app's own categories come first so small runs look like real data
+    return [DEFAULT_CATEGORIES[i] if i < len(DEFAULT_CATEGORIES) else f"Category {i + 1}" for i in range(count)]
+
+
+def account_names(count):
+    return [BASE_ACCOUNTS[i] if i < len(BASE_ACCOUNTS) else f"Account {i + 1}" for i in range(count)]
+
+
+def month_starts(start_year, years):
+    for year in range(start_year, start_year + years):
+        for month in range(1, 13):
+            yield date(year, month, 1)
+
+
+def generate_transactions(years, categories, rows, start_year=2000, seed=0):
+    # Yield (date, category, amount) rows in chronological month order, spreading `rows` evenly over the months
+    rng = random.Random(seed)
+    names = category_names(categories)
+    # Each category gets a typical spend so per-category totals differ
+    typical_amounts = {name: rng.uniform(5, 500) for name in names}
+    months = list(month_starts(start_year, years))
+    for index, month_start in enumerate(months):
+        month_rows = rows * (index + 1) // len(months) - rows * index // len(months)
+        days = calendar.monthrange(month_start.year, month_start.month)[1]
+        month_days = sorted(rng.randint(1, days) for _ in range(month_rows))
+        for day in month_days:
+            category = names[rng.randrange(len(names))]
+            amount = round(typical_amounts[category] * rng.lognormvariate(0, 0.5), 2)
+            yield month_start.replace(day=day).strftime(DB_DATE_FORMAT), category, amount
+
+
+def generate_snapshots(years, accounts, snapshots, start_year=2000, seed=0):
+    # Yield accounting_details rows: `snapshots` evenly spaced balance snapshots per account as a random walk
+    rng = random.Random(seed + 1)
+    start = date(start_year, 1, 1).toordinal()
+    span = date(start_year + years, 1, 1).toordinal() - start
+    balances = {name: [rng.uniform(0, 5000) for _ in range(4)] for name in account_names(accounts)}
+    for index in range(snapshots):
+        day = date.fromordinal(start + span * index // max(snapshots, 1))
+        timestamp = f"{day.strftime(DB_DATE_FORMAT)} {index % 24:02d}:00:00"
+        for name, values in balances.items():
+            values[:] = [max(0.0, round(value + rng.gauss(20, 200), 2)) for value in values]
+            yield (timestamp, name) + tuple(values) + (round(sum(values), 2),)
+
+
+def build_database(path, years=5, categories=21, rows=100000, accounts=3, snapshots=520, start_year=2000, seed=0):
+    # Create a fresh database at path through the ledger's own write path; returns row counts and timings
+    if os.path.exists(path):
+        os.remove(path)
+    stats = {}
+    with Ledger(path) as ledger:
+        started = time.perf_counter()
+        stats['transactions'] = ledger.add_transactions(
+            generate_transactions(years, categories, rows, start_year, seed))
+        stats['transactions_seconds'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ledger.transaction():
+            cursor = ledger.executemany("""
+                INSERT INTO accounting_details (date, account_name, checking, savings, saver, kiwi_saver, total)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, generate_snapshots(years, accounts, snapshots, start_year, seed))
+        stats['accounting_details'] = cursor.rowcount
+        stats['accounting_details_seconds'] = time.perf_counter() - started
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic budget tracker database")
+    parser.add_argument('path', help="database file to create (overwritten)")
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--categories', type=int, default=21)
+    parser.add_argument('--rows', type=int, default=100000, help="total transactions")
+    parser.add_argument('--accounts', type=int, default=3)
+    parser.add_argument('--snapshots', type=int, default=520, help="balance snapshots per account")
+    parser.add_argument('--start-year', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    stats = build_database(args.path, args.years, args.categories, args.rows, args.accounts, args.snapshots,
+                           args.start_year, args.seed)
+    rate = stats['transactions'] / stats['transactions_seconds'] if stats['transactions_seconds'] else 0
+    print(f"Wrote {stats['transactions']} transactions in {stats['transactions_seconds']:.2f}s "
+          f"({rate:.0f} rows/sec) and {stats['accounting_details']} balance snapshots to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
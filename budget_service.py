@@ -0,0 +1,362 @@
+# Local HTTP/JSON entry service, so scripts and other devices can log transactions while
+# the desktop app is open. Runs without PyQt5:
+#
+#   python budget_service.py --port 8765
+#   curl -X POST localhost:8765/transactions -d '{"date": "2024-06-08", "category": "Food", "amount": 12.5}'
+#   curl 'localhost:8765/report?month=2024-06'
+#
+# Reads run on a bounded pool of ledger connections. Inserts are handed to a single writer
+# thread that commits everything queued while its previous commit was running as one
+# transaction (group commit), so concurrent clients share fsyncs instead of queueing for
+# the write lock one by one. The database runs in WAL mode with a busy timeout (see
+# ledger.DB_PRAGMAS), so the desktop app keeps reading and writing alongside it and picks
+# new rows up through PRAGMA data_version.
+import argparse
+import json
+import math
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from ledger import Ledger, DEFAULT_DB_PATH, DB_DATE_FORMAT, month_range
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# Read connections shared by the request threads
+POOL_SIZE = 4
+# How long a request waits for a free connection before giving up with 503
+POOL_TIMEOUT_SECONDS = 5
+# How often a request waiting on its insert checks that the writer is still running
+WRITER_CHECK_SECONDS = 1
+# Most inserts committed together in one transaction
+MAX_GROUP_SIZE = 1000
+# Largest request body accepted
+MAX_BODY_BYTES = 64 * 1024
+
+
+class ServiceUnavailable(Exception):
+    pass
+
+
+class LengthRequired(Exception):
+    pass
+
+
+def is_busy(error):
+    # True for the lock errors a client can wait out, as opposed to a read-only file, I/O error or the like
+    name = getattr(error, 'sqlite_errorname', None)
+    if name is None:
+        # Python before 3.11 only has the message
+        return "locked" in str(error)
+    return name.startswith(('SQLITE_BUSY', 'SQLITE_LOCKED'))
+
+
+class ConnectionPool:
+    # A fixed set of ledger connections handed out to one request thread at a time
+    def __init__(self, db_path, size=POOL_SIZE, timeout=POOL_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()  # the most recently used connection has the warmest cache
+        self.ledgers = [Ledger(db_path, check_same_thread=False).open() for _ in range(size)]
+        for ledger in self.ledgers:
+            self.idle.put(ledger)
+
+    @contextmanager
+    def connection(self):
+        try:
+            ledger = self.idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise ServiceUnavailable("All database connections are busy")
+        try:
+            yield ledger
+        finally:
+            self.idle.put(ledger)
+
+    def close(self):
+        for ledger in self.ledgers:
+            ledger.close()
+
+
+class PendingInsert:
+    def __init__(self, row):
+        self.row = row
+        self.done = threading.Event()
+        self.transaction_id = None
+        self.error = None
+
+
+class GroupCommitWriter(threading.Thread):
+    # The only thread that writes. Each loop takes every insert queued so far, up to MAX_GROUP_SIZE,
+    # and commits them in one transaction: one commit per group instead of one per client.
+    def __init__(self, db_path, max_group_size=MAX_GROUP_SIZE):
+        super().__init__(name='group-commit-writer', daemon=True)
+        self.ledger = Ledger(db_path, check_same_thread=False).open()
+        self.max_group_size = max_group_size
+        self.pending = queue.Queue()
+        self.stats_lock = threading.Lock()
+        self.stats = {'commits': 0, 'rows': 0, 'largest_group': 0, 'errors': 0}
+
+    def submit(self, row):
+        # Queue a (date, category, amount, memo) row and wait for its commit; returns the new id.
+        # There is no timeout: a queued insert commits sooner or later, and a client told to retry
+        # in the meantime would add it twice. Only a stopped writer, which commits nothing more, gives up.
+        insert = PendingInsert(row)
+        self.pending.put(insert)
+        while not insert.done.wait(WRITER_CHECK_SECONDS):
+            if not self.is_alive():
+                raise ServiceUnavailable("The writer has stopped")
+        if insert.error is not None:
+            raise insert.error
+        return insert.transaction_id
+
+    def run(self):
+        while True:
+            # Block for the first insert, then take whatever else arrived in the meantime
+            group = [self.pending.get()]
+            while group[-1] is not None and len(group) < self.max_group_size:
+                try:
+                    group.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = group[-1] is None
+            inserts = [insert for insert in group if insert is not None]
+            if inserts:
+                self.commit(inserts)
+            if stopping:
+                self.ledger.close()
+                return
+
+    def commit(self, inserts):
+        try:
+            self.insert_group(inserts)
+        except sqlite3.Error:
+            # Commit the rows one by one so a single bad row only fails its own request
+            for insert in inserts:
+                try:
+                    self.insert_group([insert])
+                except sqlite3.Error as e:
+                    insert.error = e
+                    with self.stats_lock:
+                        self.stats['errors'] += 1
+        for insert in inserts:
+            insert.done.set()
+
+    def insert_group(self, inserts):
+        # All rows go through add_transactions in one transaction. Nothing else inserts on this
+        # connection meanwhile and the write lock is held throughout, so the new ids are consecutive.
+        self.ledger.add_transactions([insert.row for insert in inserts])
+        last_id = self.ledger.query_one("SELECT last_insert_rowid()")[0]
+        for offset, insert in enumerate(inserts):
+            insert.transaction_id = last_id - len(inserts) + 1 + offset
+        with self.stats_lock:
+            self.stats['commits'] += 1
+            self.stats['rows'] += len(inserts)
+            self.stats['largest_group'] = max(self.stats['largest_group'], len(inserts))
+
+    def get_stats(self):
+        with self.stats_lock:
+            return dict(self.stats)
+
+    def stop(self):
+        # Commit what is already queued, then exit
+        self.pending.put(None)
+        self.join()
+
+
+def parse_transaction(body):
+    # Validate a JSON transaction into a (date, category, amount, memo) row; raises ValueError
+    if not isinstance(body, dict):
+        raise ValueError("Expected a JSON object")
+    try:
+        row_date = datetime.strptime(str(body['date']), DB_DATE_FORMAT).strftime(DB_DATE_FORMAT)
+    except KeyError:
+        raise ValueError("date is required")
+    except ValueError:
+        raise ValueError(f"date must be YYYY-MM-DD, got {body['date']!r}")
+    category = str(body.get('category') or "").strip()
+    if not category:
+        raise ValueError("category is required")
+    try:
+        amount = float(body['amount'])
+    except KeyError:
+        raise ValueError("amount is required")
+    except (TypeError, ValueError):
+        raise ValueError(f"amount must be a number, got {body['amount']!r}")
+    # NaN can't be stored and infinity would stick in the monthly totals for good
+    if not math.isfinite(amount):
+        raise ValueError(f"amount must be a finite number, got {body['amount']!r}")
+    memo = body.get('memo')
+    return row_date, category, amount, None if memo is None else str(memo)
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    # self.server is a BudgetService
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.headers.get('Content-Length', '0') != '0' or 'Transfer-Encoding' in self.headers:
+            # GET bodies are never read, so the connection can't carry another request
+            self.close_connection = True
+        url = urlsplit(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        routes = {
+            '/health': lambda: {'status': 'ok'},
+            '/months': lambda: self.read(Ledger.get_month_keys),
+            '/report': lambda: self.report(params),
+            '/stats': self.server.writer.get_stats,
+        }
+        if url.path.startswith('/transactions/'):
+            self.respond_with(lambda: self.get_transaction(url.path.rsplit('/', 1)[1]))
+        elif url.path in routes:
+            self.respond_with(routes[url.path])
+        else:
+            self.send_json(404, {'error': f"No such resource: {url.path}"})
+
+    def do_POST(self):
+        if urlsplit(self.path).path != '/transactions':
+            # The body is left unread, so the connection can't carry another request
+            self.close_connection = True
+            self.send_json(404, {'error': f"No such resource: {self.path}"})
+            return
+        self.respond_with(self.add_transaction, status=201)
+
+    def add_transaction(self):
+        row = parse_transaction(self.read_json())
+        transaction_id = self.server.writer.submit(row)
+        return {'id': transaction_id, 'date': row[0], 'category': row[1], 'amount': row[2], 'memo': row[3]}
+
+    def get_transaction(self, transaction_id):
+        if not transaction_id.isdigit():
+            raise ValueError(f"Bad transaction id {transaction_id!r}")
+        row = self.read(Ledger.get_transaction, int(transaction_id))
+        if row is None:
+            raise LookupError(f"No transaction {transaction_id}")
+        return dict(zip(('id', 'date', 'category', 'amount', 'memo'), row))
+
+    def report(self, params):
+        # Spending by category for ?month=YYYY-MM, or ?start=...&end=... (ISO dates, end exclusive)
+        if 'month' in params:
+            try:
+                month_start = datetime.strptime(params['month'], '%Y-%m')
+            except ValueError:
+                raise ValueError(f"month must be YYYY-MM, got {params['month']!r}")
+            spending = self.read(Ledger.get_monthly_totals, month_start.strftime('%Y-%m'))
+            start_date, end_date = month_range(month_start)
+        elif 'start' in params and 'end' in params:
+            start_date, end_date = params['start'], params['end']
+            for value in (start_date, end_date):
+                try:
+                    datetime.strptime(value, DB_DATE_FORMAT)
+                except ValueError:
+                    raise ValueError(f"start and end must be YYYY-MM-DD, got {value!r}")
+            spending = self.read(Ledger.get_spending_by_category, start_date, end_date)
+        else:
+            raise ValueError("Give month=YYYY-MM, or start and end dates")
+        categories = [{'category': category, 'total': total} for category, total in spending]
+        return {'start': start_date, 'end': end_date, 'categories': categories,
+                'total': sum(total for _, total in spending)}
+
+    def read(self, function, *args):
+        with self.server.pool.connection() as ledger:
+            return function(ledger, *args)
+
+    def read_json(self):
+        if 'Content-Length' not in self.headers and 'Transfer-Encoding' in self.headers:
+            # Chunked bodies aren't read, so the connection can't carry another request either
+            self.close_connection = True
+            raise LengthRequired("Send the request body with a Content-Length")
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if not 0 <= length <= MAX_BODY_BYTES:
+            # The body is left unread, so the connection can't carry another request
+            self.close_connection = True
+            raise ValueError("Request body too large" if length > MAX_BODY_BYTES else "Bad Content-Length")
+        try:
+            return json.loads(self.rfile.read(length) or b'null')
+        except ValueError:
+            raise ValueError("Request body is not valid JSON")
+
+    def respond_with(self, produce, status=200):
+        # Run produce() and send its result as JSON, mapping failures to HTTP errors
+        try:
+            result = produce()
+        except ValueError as e:
+            self.send_json(400, {'error': str(e)})
+        except LookupError as e:
+            self.send_json(404, {'error': str(e)})
+        except LengthRequired as e:
+            self.send_json(411, {'error': str(e)})
+        except ServiceUnavailable as e:
+            self.send_json(503, {'error': str(e)}, retry_after=1)
+        except sqlite3.OperationalError as e:
+            if is_busy(e):
+                # Still locked after the busy timeout; the client can try again
+                self.send_json(503, {'error': f"Database busy: {e}"}, retry_after=1)
+            else:
+                self.send_json(500, {'error': f"Database error: {e}"})
+        except sqlite3.Error as e:
+            self.send_json(500, {'error': f"Database error: {e}"})
+        else:
+            self.send_json(status, result)
+
+    def send_json(self, status, payload, retry_after=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if retry_after is not None:
+            self.send_header('Retry-After', str(retry_after))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+class BudgetService(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, db_path=DEFAULT_DB_PATH, pool_size=POOL_SIZE, quiet=False):
+        # The writer opens first, so any schema migration is done before the pool connects
+        self.writer = GroupCommitWriter(db_path)
+        self.pool = ConnectionPool(db_path, pool_size)
+        self.quiet = quiet
+        super().__init__(address, ServiceHandler)
+        self.writer.start()
+
+    def server_close(self):
+        super().server_close()
+        self.writer.stop()
+        self.pool.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the budget tracker ledger over local HTTP/JSON")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help=f"database file (default: {DEFAULT_DB_PATH})")
+    parser.add_argument('--host', default=DEFAULT_HOST,
+                        help=f"address to listen on (default: {DEFAULT_HOST}, this machine only)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--pool-size', type=int, default=POOL_SIZE, help="read connections")
+    parser.add_argument('--quiet', action='store_true', help="don't log each request")
+    args = parser.parse_args(argv)
+
+    service = BudgetService((args.host, args.port), args.db, args.pool_size, args.quiet)
+    print(f"Serving {args.db} on http://{args.host}:{service.server_address[1]}")
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.server_close()
+
+
+if __name__ == "__main__":
+    main()
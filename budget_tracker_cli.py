@@ -0,0 +1,256 @@
+# Command line interface to the budget tracker ledger.
+# Runs without PyQt5 or a display, so imports and reports can be scheduled from cron:
+#
+#   python budget_tracker_cli.py import budget.xlsx
+#   python budget_tracker_cli.py import-csv statement.csv --mapping bank_csv_mapping.json
+#   python budget_tracker_cli.py report 2024-06
+#   python budget_tracker_cli.py export --start 2024-01-01 --end 2025-01-01 -o 2024.csv
+import argparse
+import sqlite3
+import sys
+from datetime import datetime
+
+from ledger import Ledger, DEFAULT_DB_PATH, DB_DATE_FORMAT, SEARCH_RESULT_LIMIT, format_month_label
+
+
+def parse_iso_date(value):
+    # argparse type for 'YYYY-MM-DD' dates, normalised back to the storage format
+    try:
+        return datetime.strptime(value, DB_DATE_FORMAT).strftime(DB_DATE_FORMAT)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a YYYY-MM-DD date, got {value!r}")
+
+
+def parse_month(value):
+    # argparse type for 'YYYY-MM' months
+    try:
+        return datetime.strptime(value, '%Y-%m')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a YYYY-MM month, got {value!r}")
+
+
+def command_add(ledger, args):
+    transaction_id = ledger.add_transaction(args.date, args.category, args.amount, args.memo)
+    print(f"Added transaction {transaction_id}")
+
+
+def command_import(ledger, args):
+    imported, elapsed = ledger.import_excel(args.file)
+    rate = imported / elapsed if elapsed > 0 else 0
+    print(f"Imported {imported} transactions from {args.file} in {elapsed:.2f}s ({rate:.0f} rows/sec)")
+
+
+def command_import_csv(ledger, args):
+    from bank_csv import load_mapping
+
+    try:
+        inserted, skipped, elapsed = ledger.import_bank_csv(args.file, load_mapping(args.mapping))
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(f"Imported {inserted} new transactions from {args.file} and skipped {skipped} already imported "
+          f"in {elapsed:.2f}s")
+
+
+def command_months(ledger, args):
+    for month in ledger.get_month_keys():
+        print(month)
+
+
+def command_report(ledger, args):
+    # A single month reads the precomputed summary; explicit ranges aggregate the raw rows
+    if args.month is not None:
+        print(format_month_label(args.month.strftime('%Y-%m')))
+        spending = ledger.get_monthly_totals(args.month.strftime('%Y-%m'))
+    else:
+        if args.start is None or args.end is None:
+            raise SystemExit("report needs a MONTH or both --start and --end")
+        print(f"{args.start} to {args.end}")
+        spending = ledger.get_spending_by_category(args.start, args.end)
+
+    grand_total = 0.0
+    for category, total in spending:
+        print(f"{category:<20} {total:>12.2f}")
+        grand_total += total or 0
+    print(f"{'Total':<20} {grand_total:>12.2f}")
+
+
+def command_export(ledger, args):
+    if args.output == '-':
+        exported = ledger.export_csv(sys.stdout, args.start, args.end)
+    else:
+        with open(args.output, 'w', newline='') as output:
+            exported = ledger.export_csv(output, args.start, args.end)
+    print(f"Exported {exported} transactions", file=sys.stderr)
+
+
+def command_trends(ledger, args):
+    # numpy is only needed here, so the analytics module is imported on first use
+    from analytics import TransactionColumns, category_summary
+
+    summary = category_summary(TransactionColumns.load(ledger), args.as_of)
+    if summary['as_of'] is None:
+        print("No transactions.")
+        return
+    print(f"As of {summary['as_of']}")
+    print(f"{'Category':<20} {'Month':>12} {'Forecast':>12} {'3m avg':>12} {'12m avg':>12} {'YoY':>12}")
+    for trends in summary['categories']:
+        values = [trends[key] for key in ('month_to_date', 'forecast', 'average_3', 'average_12', 'yoy_delta')]
+        print(f"{trends['category']:<20} " + " ".join(f"{value:>12.2f}" for value in values))
+
+
+def command_search(ledger, args):
+    rows, count, total = ledger.search_transactions(" ".join(args.words), args.limit)
+    for _, row_date, category, amount, memo in rows:
+        print(f"{row_date}  {category:<20} {amount:>12.2f}  {memo}")
+    shown = f", newest {len(rows)} shown" if len(rows) < count else ""
+    print(f"{count} matching transactions totalling {total:.2f}{shown}")
+
+
+def command_archive(ledger, args):
+    for year in args.years:
+        try:
+            moved = ledger.archive_year(year, vacuum=not args.no_vacuum)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        print(f"Archived {moved} transactions from {year} to {ledger.archive_path(year)}")
+
+
+def command_archives(ledger, args):
+    for year, path, row_count, first_date, last_date, total in ledger.get_archives():
+        print(f"{year}  {path:<30} {row_count:>8} rows  {first_date} to {last_date}  {total:>12.2f}")
+
+
+def command_categories(ledger, args):
+    try:
+        if args.add:
+            ledger.add_category(args.add)
+        if args.rename:
+            old_name, new_name = args.rename
+            category_ids = {name: category_id for category_id, name in ledger.get_categories()}
+            if old_name not in category_ids:
+                raise SystemExit(f"No category named {old_name}")
+            ledger.rename_category(category_ids[old_name], new_name)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    for category_id, name in ledger.get_categories():
+        print(f"{category_id:>4}  {name}")
+
+
+def command_budgets(ledger, args):
+    from budgets import BudgetMonitor
+
+    category_ids = {name: category_id for category_id, name in ledger.get_categories()}
+    changes = [(name, limit) for name, limit in args.set or []] + [(name, None) for name in args.clear or []]
+    for name, limit in changes:
+        if name not in category_ids:
+            raise SystemExit(f"No category named {name}")
+        try:
+            ledger.set_budget(category_ids[name], limit)
+        except ValueError as e:
+            raise SystemExit(str(e))
+    monitor = BudgetMonitor.load(ledger, args.month.strftime('%Y-%m') if args.month else None)
+    print(format_month_label(monitor.month))
+    for status in monitor.statuses():
+        print(f"{status['category']:<20} {status['spent']:>10.2f} of {status['limit']:>10.2f}  "
+              f"{status['remaining']:>10.2f} left  {status['state']}")
+
+
+def command_verify_totals(ledger, args):
+    mismatches = ledger.verify_monthly_totals()
+    if mismatches == 0:
+        print("Monthly totals are up to date.")
+        return
+    print(f"Monthly totals out of date for {mismatches} month/category rows.")
+    if args.rebuild:
+        ledger.rebuild_monthly_totals()
+        print("Rebuilt monthly totals.")
+    else:
+        raise SystemExit(1)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='budget-tracker', description="Budget tracker ledger tools")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help=f"database file (default: {DEFAULT_DB_PATH})")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', help="add a single transaction")
+    add.add_argument('date', type=parse_iso_date, help="YYYY-MM-DD")
+    add.add_argument('category')
+    add.add_argument('amount', type=float)
+    add.add_argument('--memo', help="payee or note")
+    add.set_defaults(handler=command_add)
+
+    import_excel = commands.add_parser('import', help="import a category-by-month Excel workbook")
+    import_excel.add_argument('file')
+    import_excel.set_defaults(handler=command_import)
+
+    import_csv = commands.add_parser('import-csv', help="import a bank statement CSV, skipping lines already imported")
+    import_csv.add_argument('file')
+    import_csv.add_argument('--mapping', help="JSON column mapping and category rules (see bank_csv.py)")
+    import_csv.set_defaults(handler=command_import_csv)
+
+    months = commands.add_parser('months', help="list the months that have transactions")
+    months.set_defaults(handler=command_months)
+
+    report = commands.add_parser('report', help="spending by category for a month or date range")
+    report.add_argument('month', nargs='?', type=parse_month, help="YYYY-MM")
+    report.add_argument('--start', type=parse_iso_date, help="first day of the range, YYYY-MM-DD")
+    report.add_argument('--end', type=parse_iso_date, help="day after the range, YYYY-MM-DD")
+    report.set_defaults(handler=command_report)
+
+    export = commands.add_parser('export', help="export transactions as CSV")
+    export.add_argument('-o', '--output', default='-', help="output file (default: stdout)")
+    export.add_argument('--start', type=parse_iso_date, help="first day to export, YYYY-MM-DD")
+    export.add_argument('--end', type=parse_iso_date, help="day after the last one to export, YYYY-MM-DD")
+    export.set_defaults(handler=command_export)
+
+    trends = commands.add_parser('trends', help="rolling averages, year-over-year change and forecasts per category")
+    trends.add_argument('--as-of', type=parse_iso_date, help="day to report as of, YYYY-MM-DD (default: latest transaction)")
+    trends.set_defaults(handler=command_trends)
+
+    search = commands.add_parser('search', help="find transactions by payee/memo, with their total")
+    search.add_argument('words', nargs='+', metavar='WORD', help="every word must appear in the memo")
+    search.add_argument('--limit', type=int, default=SEARCH_RESULT_LIMIT, help="most rows to list")
+    search.set_defaults(handler=command_search)
+
+    archive = commands.add_parser('archive', help="move closed years out to per-year archive files")
+    archive.add_argument('years', nargs='+', type=int, metavar='YEAR')
+    archive.add_argument('--no-vacuum', action='store_true', help="don't compact the main database afterwards")
+    archive.set_defaults(handler=command_archive)
+
+    archives = commands.add_parser('archives', help="list the archived years")
+    archives.set_defaults(handler=command_archives)
+
+    categories = commands.add_parser('categories', help="list, add or rename categories")
+    categories.add_argument('--add', metavar='NAME', help="add a category")
+    categories.add_argument('--rename', nargs=2, metavar=('OLD', 'NEW'), help="rename a category everywhere")
+    categories.set_defaults(handler=command_categories)
+
+    budgets = commands.add_parser('budgets', help="show spending against monthly category budgets, or set them")
+    budgets.add_argument('month', nargs='?', type=parse_month, help="YYYY-MM (default: this month)")
+    budgets.add_argument('--set', nargs=2, action='append', metavar=('CATEGORY', 'LIMIT'),
+                         help="set a category's monthly budget (repeatable)")
+    budgets.add_argument('--clear', action='append', metavar='CATEGORY', help="remove a category's budget")
+    budgets.set_defaults(handler=command_budgets)
+
+    verify = commands.add_parser('verify-totals', help="check the monthly totals table against the transactions")
+    verify.add_argument('--rebuild', action='store_true', help="rebuild the totals if they have drifted")
+    verify.set_defaults(handler=command_verify_totals)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        with Ledger(args.db) as ledger:
+            args.handler(ledger, args)
+    except ImportError as e:
+        raise SystemExit(f"Missing optional dependency: {e.name}")
+    except sqlite3.Error as e:
+        raise SystemExit(f"Database error: {e}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+# Running per-category spending for the current month, checked against monthly budgets.
+# The totals are seeded once from the monthly summary table and then kept up to date in
+# memory as transactions are added, so showing what is left of a budget never needs an
+# aggregate query.
+from datetime import date
+
+# A budget counts as nearly spent once this share of it is gone
+BUDGET_WARNING_RATIO = 0.9
+
+
+def parse_amount(amount):
+    # Amounts as the ledger counts them: text that isn't a number counts as 0, like the monthly totals triggers
+    try:
+        return float(amount)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class BudgetMonitor:
+    def __init__(self, month, limits, spent):
+        self.month = month              # 'YYYY-MM' the totals are for
+        self.limits = dict(limits)      # category -> monthly limit
+        self.spent = dict(spent)        # category -> spent so far this month
+
+    @classmethod
+    def load(cls, ledger, month=None):
+        # Seed from the budgets table and the month's precomputed totals; month defaults to this month
+        month = month or date.today().strftime('%Y-%m')
+        return cls(month, ledger.get_budgets(), ledger.get_monthly_totals(month))
+
+    def record(self, row_date, category, amount):
+        # Count a stored transaction; rows outside the month are ignored. Returns the category's status.
+        if row_date[:7] == self.month:
+            self.spent[category] = self.spent.get(category, 0.0) + parse_amount(amount)
+        return self.status(category)
+
+    def set_limit(self, category, limit):
+        if limit is None:
+            self.limits.pop(category, None)
+        else:
+            self.limits[category] = limit
+
+    def status(self, category, pending=0.0):
+        # {'category', 'limit', 'spent', 'remaining', 'state'} for a category, with a pending amount counted
+        # as if it were already spent. state is 'none' without a budget, else 'ok', 'warning' or 'over'.
+        spent = self.spent.get(category, 0.0) + parse_amount(pending)
+        limit = self.limits.get(category)
+        if limit is None:
+            return {'category': category, 'limit': None, 'spent': spent, 'remaining': None, 'state': 'none'}
+        remaining = limit - spent
+        if remaining < 0:
+            state = 'over'
+        elif spent >= limit * BUDGET_WARNING_RATIO:
+            state = 'warning'
+        else:
+            state = 'ok'
+        return {'category': category, 'limit': limit, 'spent': spent, 'remaining': remaining, 'state': state}
+
+    def statuses(self):
+        # Status of every budgeted category, by name
+        return [self.status(category) for category in sorted(self.limits)]
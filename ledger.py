@@ -0,0 +1,1257 @@
+# Qt-free storage and reporting for the budget tracker.
+# Everything that touches budget_tracker.db lives here so the GUI, the CLI and
+# batch jobs share one implementation on plain sqlite3.
+import csv
+import heapq
+import itertools
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, date
+
+from query_stats import query_stats
+
+DEFAULT_DB_PATH = 'budget_tracker.db'
+
+# Dates are stored as ISO 'YYYY-MM-DD' text so they sort correctly and can use an index
+DB_DATE_FORMAT = '%Y-%m-%d'
+# Older databases stored dates in the display format, e.g. '08-Jun-24'
+LEGACY_DATE_FORMAT = '%d-%b-%y'
+# Bump this whenever Ledger.migrate learns a new step
+SCHEMA_VERSION = 7
+
+# Connection pragmas applied when a ledger is opened. Override any of them with
+# BUDGET_TRACKER_PRAGMAS, e.g. "synchronous=FULL,cache_size=-64000".
+DB_PRAGMAS = {
+    'journal_mode': 'WAL',      # readers don't block the writer, one sync per commit
+    'synchronous': 'NORMAL',    # safe with WAL, avoids an fsync on every commit
+    'cache_size': -20000,       # negative means KiB, so about 20 MB of page cache
+    'temp_store': 'MEMORY',
+    # Wait this many ms for another process's write lock instead of failing at once with "database is locked"
+    'busy_timeout': 5000,
+}
+# Rows bound per executemany call when bulk inserting
+INSERT_BATCH_SIZE = 5000
+
+# Month column headers accepted by the Excel importer when they are text rather than dates
+EXCEL_MONTH_FORMATS = ['%b-%y', '%b-%Y', '%B-%Y', '%b %y', '%b %Y', '%B %Y', '%Y-%m', '%m/%Y', '%Y-%m-%d']
+
+# Categories a new database starts with; edit them from the app's category manager
+DEFAULT_CATEGORIES = [
+    "Salary", "Rent", "Karate", "Broadband", "Phone",
+    "Electricity", "Water", "Sam", "Food", "Eating out",
+    "Sid", "Divs", "Car", "Remit", "Insurance", "Lotto",
+    "Electronix", "Medical", "Laundry", "Trip", "General"
+]
+
+# Closed years can be moved out of the main file into one archive database per year,
+# named after the main file, e.g. budget_tracker-2019.db next to budget_tracker.db
+ARCHIVE_FILE_FORMAT = '{stem}-{year}{ext}'
+# Archives kept attached to one connection at once; SQLite allows 10 attachments by default
+MAX_ATTACHED_ARCHIVES = 8
+# Bump this whenever Ledger.upgrade_archive learns a new step
+ARCHIVE_SCHEMA_VERSION = 3
+
+# Columns the transaction history can be sorted on
+TRANSACTION_SORT_COLUMNS = ('date', 'category', 'amount')
+# What each sort orders the history by, as (row index, SQL expression) pairs; the id breaks any remaining tie.
+# Categories go by name and then date, which is the (category_id, date) index's order within each category.
+TRANSACTION_SORT_KEYS = {
+    'date': [(1, 't.date')],
+    'category': [(2, 'c.name'), (1, 't.date')],
+    'amount': [(3, 't.amount')],
+}
+# Most rows a memo search returns; the match count and total always cover every match
+SEARCH_RESULT_LIMIT = 500
+
+# Balance columns of an accounting snapshot, in table order
+ACCOUNT_BALANCE_COLUMNS = ('checking', 'savings', 'saver', 'kiwi_saver', 'total')
+
+# SQL expressions that map a snapshot's 'YYYY-MM-DD HH:MM:SS' date to its history bucket
+BALANCE_HISTORY_BUCKETS = {
+    'day': "substr(date, 1, 10)",
+    'week': "date(substr(date, 1, 10), '-6 days', 'weekday 1')",  # Monday of the week
+    'month': "substr(date, 1, 7)",
+    'year': "substr(date, 1, 4)",
+}
+
+
+def get_db_pragmas():
+    # DB_PRAGMAS with any overrides from the environment
+    pragmas = dict(DB_PRAGMAS)
+    for setting in os.environ.get('BUDGET_TRACKER_PRAGMAS', '').split(','):
+        name, _, value = setting.partition('=')
+        if name.strip() and value.strip():
+            pragmas[name.strip()] = value.strip()
+    return pragmas
+
+
+def month_range(month_start):
+    # Half-open [first day of month, first day of next month) range as ISO strings
+    if month_start.month == 12:
+        next_month = month_start.replace(year=month_start.year + 1, month=1, day=1)
+    else:
+        next_month = month_start.replace(month=month_start.month + 1, day=1)
+    return month_start.strftime(DB_DATE_FORMAT), next_month.strftime(DB_DATE_FORMAT)
+
+
+def normalize_balance(value):
+    # Compare balances the way SQLite stores them: numeric text as a number, blanks as missing
+    if value is None or (isinstance(value, str) and value.strip() == ""):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return str(value).strip()
+
+
+def normalize_memo(value):
+    # Memos are optional; blank ones are stored as NULL so they stay out of the search index
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def format_month_label(month):
+    # Convert 'YYYY-MM' to 'MMM-YYYY', or None if it isn't a month
+    try:
+        return datetime.strptime(month, '%Y-%m').strftime('%b-%Y')
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_excel_month(header):
+    # Turn a month column header into the first day of that month, or None if it isn't one
+    if isinstance(header, (datetime, date)):
+        return date(header.year, header.month, 1)
+    if isinstance(header, str):
+        for month_format in EXCEL_MONTH_FORMATS:
+            try:
+                parsed = datetime.strptime(header.strip(), month_format)
+            except ValueError:
+                continue
+            return date(parsed.year, parsed.month, 1)
+    return None
+
+
+def read_excel_transactions(worksheet):
+    # Stream (date, category, amount) rows out of a category-by-month sheet.
+    # The first row holds the month headers; each later row is a category followed by its amounts.
+    rows = worksheet.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return
+
+    month_columns = []
+    for column, month_header in enumerate(header[1:], start=1):
+        month_start = parse_excel_month(month_header)
+        if month_start is None:
+            if month_header is not None:
+                print(f"Skipping column {month_header!r}: not a month")
+            continue
+        month_columns.append((column, month_start.strftime(DB_DATE_FORMAT)))
+
+    for row in rows:
+        if not row or row[0] is None or str(row[0]).strip() == "":
+            continue
+        category = str(row[0]).strip()
+        for column, month_date in month_columns:
+            amount = row[column] if column < len(row) else None
+            # Blank or zero cells are months with no spending in that category
+            if amount in (None, "", 0):
+                continue
+            try:
+                amount = float(amount)
+            except (TypeError, ValueError):
+                print(f"Skipping non-numeric amount {amount!r} for {category} in {month_date[:7]}")
+                continue
+            yield month_date, category, amount
+
+
+class Ledger:
+    def __init__(self, path=DEFAULT_DB_PATH, check_same_thread=True):
+        self.path = path
+        # Pass False when a connection is opened on one thread and closed from another
+        self.check_same_thread = check_same_thread
+        self.conn = None
+        # Schema name -> year of each attached archive, least recently used first
+        self.attached_archives = OrderedDict()
+
+    def open(self):
+        # Connect, tune the connection and bring the schema up to date.
+        # Transactions are managed explicitly, so the connection runs in autocommit mode.
+        self.conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=self.check_same_thread)
+
+        # Tune the connection before touching any tables
+        for name, value in get_db_pragmas().items():
+            try:
+                self.execute(f"PRAGMA {name} = {value}")
+            except sqlite3.Error as e:
+                print(f"Could not set PRAGMA {name}: {e}")
+
+        # Create a table if it doesn't exist
+        self.execute("""
+            CREATE TABLE IF NOT EXISTS transactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE NOT NULL,
+                date TEXT NOT NULL,
+                category TEXT NOT NULL,
+                amount REAL NOT NULL
+            )
+        """)
+
+        # Create a table for accounting details if it doesn't exist
+        self.execute("""
+            CREATE TABLE IF NOT EXISTS accounting_details (
+                id INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE NOT NULL,
+                date TEXT NOT NULL,
+                account_name TEXT NOT NULL,
+                checking REAL,
+                savings REAL,
+                saver REAL,
+                kiwi_saver REAL,
+                total REAL NOT NULL
+            )
+        """)
+
+        # Bring older databases up to the current schema
+        self.migrate()
+
+        # Date filters are range predicates, so index the ISO date column
+        self.execute("CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (date)")
+        # The history view filters on category and sorts within it
+        self.execute("CREATE INDEX IF NOT EXISTS idx_transactions_category_date ON transactions (category_id, date)")
+        # Latest balance lookups and history downsampling walk each account's snapshots in date order
+        self.execute(
+            "CREATE INDEX IF NOT EXISTS idx_accounting_details_account_date ON accounting_details (account_name, date, id)")
+
+        # Memo searches use an FTS5 index when this SQLite has the module, and LIKE otherwise
+        self.full_text_search = self.has_memo_index('main')
+        if not self.full_text_search:
+            with self.transaction():
+                self.full_text_search = self.create_memo_index('main')
+        return self
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+            self.attached_archives.clear()
+
+    def __enter__(self):
+        return self if self.conn is not None else self.open()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Statement execution. Every statement goes through these so query_stats sees its
+    # latency, bind count and row count, and slow reads get their query plan logged.
+
+    def execute(self, sql, params=()):
+        # Run a statement whose rows aren't needed; returns the cursor
+        return self.timed(sql, params, len(params), lambda: self.conn.execute(sql, params),
+                          lambda cursor: max(cursor.rowcount, 0))
+
+    def executemany(self, sql, seq_of_params):
+        # Run one prepared statement for every parameter row; returns the cursor
+        if not isinstance(seq_of_params, (list, tuple)):
+            seq_of_params = list(seq_of_params)
+        binds = sum(len(params) for params in seq_of_params)
+        return self.timed(sql, (), binds, lambda: self.conn.executemany(sql, seq_of_params),
+                          lambda cursor: max(cursor.rowcount, 0))
+
+    def query(self, sql, params=()):
+        # Every result row as a list
+        return self.timed(sql, params, len(params), lambda: self.conn.execute(sql, params).fetchall(), len)
+
+    def query_one(self, sql, params=()):
+        # The first result row, or None
+        return self.timed(sql, params, len(params), lambda: self.conn.execute(sql, params).fetchone(),
+                          lambda row: 0 if row is None else 1)
+
+    def iterate(self, sql, params=()):
+        # Stream result rows in batches. Only time spent inside SQLite counts towards the
+        # statement's latency, not time the caller spends on each row.
+        elapsed, rows, error = 0.0, 0, None
+        try:
+            started = time.perf_counter()
+            cursor = self.conn.execute(sql, params)
+            while True:
+                batch = cursor.fetchmany(500)
+                elapsed += time.perf_counter() - started
+                if not batch:
+                    break
+                rows += len(batch)
+                yield from batch
+                started = time.perf_counter()
+        except sqlite3.Error as e:
+            error = e
+            raise
+        finally:
+            self.record_statement(sql, params, len(params), elapsed, rows, error)
+
+    def timed(self, sql, params, binds, run, count_rows):
+        # Time run() and record it against sql; count_rows turns its result into a row count
+        started = time.perf_counter()
+        try:
+            result = run()
+        except sqlite3.Error as e:
+            self.record_statement(sql, params, binds, time.perf_counter() - started, 0, e)
+            raise
+        self.record_statement(sql, params, binds, time.perf_counter() - started, count_rows(result))
+        return result
+
+    def record_statement(self, sql, params, binds, elapsed, rows, error=None):
+        # Fold the statement into query_stats, logging its query plan if it was slow
+        query_stats.record(sql, binds, elapsed, rows, error)
+        if error is None and query_stats.is_slow(elapsed):
+            query_stats.record_slow(sql, binds, elapsed, rows, self.explain(sql, params))
+
+    def explain(self, sql, params=()):
+        # EXPLAIN QUERY PLAN detail lines for a read; writes and pragmas have no plan worth logging
+        if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+            return []
+        try:
+            return [row[-1] for row in self.conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        except sqlite3.Error as e:
+            return [f"EXPLAIN QUERY PLAN failed: {e}"]
+
+    @contextmanager
+    def transaction(self):
+        # Run the block as one write transaction, rolling back if anything raises
+        self.execute("BEGIN IMMEDIATE")
+        try:
+            yield self
+        except BaseException:
+            self.execute("ROLLBACK")
+            raise
+        self.execute("COMMIT")
+
+    def migrate(self):
+        version = self.query_one("PRAGMA user_version")[0]
+        if version >= SCHEMA_VERSION:
+            return
+
+        if version < 1:
+            # Version 1: rewrite 'dd-MMM-yy' transaction dates as ISO 'YYYY-MM-DD'
+            with self.transaction():
+                legacy_dates = [row[0] for row in self.query(
+                    "SELECT DISTINCT date FROM transactions WHERE date NOT LIKE '____-__-__'")]
+                for legacy_date in legacy_dates:
+                    try:
+                        iso_date = datetime.strptime(legacy_date, LEGACY_DATE_FORMAT).strftime(DB_DATE_FORMAT)
+                    except (TypeError, ValueError):
+                        print(f"Leaving unrecognised transaction date as is: {legacy_date!r}")
+                        continue
+                    self.execute("UPDATE transactions SET date = ? WHERE date = ?", (iso_date, legacy_date))
+                self.execute("PRAGMA user_version = 1")
+
+        if version < 2:
+            # Version 2: per (month, category) totals kept in step with transactions by triggers
+            with self.transaction():
+                self.execute("""
+                    CREATE TABLE IF NOT EXISTS monthly_category_totals (
+                        month TEXT NOT NULL,
+                        category TEXT NOT NULL,
+                        total REAL NOT NULL DEFAULT 0,
+                        count INTEGER NOT NULL DEFAULT 0,
+                        PRIMARY KEY (month, category)
+                    ) WITHOUT ROWID
+                """)
+                self.execute("""
+                    CREATE TRIGGER IF NOT EXISTS trg_transactions_totals_insert
+                    AFTER INSERT ON transactions
+                    BEGIN
+                        INSERT INTO monthly_category_totals (month, category, total, count)
+                        VALUES (substr(NEW.date, 1, 7), NEW.category, IFNULL(NEW.amount + 0, 0), 1)
+                        ON CONFLICT (month, category) DO UPDATE
+                        SET total = total + excluded.total, count = count + 1;
+                    END
+                """)
+                self.execute("""
+                    CREATE TRIGGER IF NOT EXISTS trg_transactions_totals_delete
+                    AFTER DELETE ON transactions
+                    BEGIN
+                        UPDATE monthly_category_totals
+                        SET total = total - IFNULL(OLD.amount + 0, 0), count = count - 1
+                        WHERE month = substr(OLD.date, 1, 7) AND category = OLD.category;
+                        DELETE FROM monthly_category_totals
+                        WHERE month = substr(OLD.date, 1, 7) AND category = OLD.category AND count <= 0;
+                    END
+                """)
+                self.execute("""
+                    CREATE TRIGGER IF NOT EXISTS trg_transactions_totals_update
+                    AFTER UPDATE OF date, category, amount ON transactions
+                    BEGIN
+                        UPDATE monthly_category_totals
+                        SET total = total - IFNULL(OLD.amount + 0, 0), count = count - 1
+                        WHERE month = substr(OLD.date, 1, 7) AND category = OLD.category;
+                        DELETE FROM monthly_category_totals
+                        WHERE month = substr(OLD.date, 1, 7) AND category = OLD.category AND count <= 0;
+                        INSERT INTO monthly_category_totals (month, category, total, count)
+                        VALUES (substr(NEW.date, 1, 7), NEW.category, IFNULL(NEW.amount + 0, 0), 1)
+                        ON CONFLICT (month, category) DO UPDATE
+                        SET total = total + excluded.total, count = count + 1;
+                    END
+                """)
+                self.execute("PRAGMA user_version = 2")
+            # The summary is seeded once version 4 has put it in its final shape
+
+        if version < 3:
+            # Version 3: catalog of closed years moved out to per-year archive files
+            with self.transaction():
+                self.execute("""
+                    CREATE TABLE IF NOT EXISTS archives (
+                        year INTEGER PRIMARY KEY,
+                        path TEXT NOT NULL,
+                        row_count INTEGER NOT NULL,
+                        first_date TEXT,
+                        last_date TEXT,
+                        total REAL NOT NULL DEFAULT 0
+                    )
+                """)
+                # Months with archived data, so the month list never has to open an archive
+                self.execute("""
+                    CREATE TABLE IF NOT EXISTS archived_months (
+                        month TEXT PRIMARY KEY,
+                        year INTEGER NOT NULL
+                    ) WITHOUT ROWID
+                """)
+                self.execute("PRAGMA user_version = 3")
+
+        if version < 4:
+            # Version 4: category names are interned in a table and rows refer to them by integer id
+            with self.transaction():
+                self.execute("""
+                    CREATE TABLE IF NOT EXISTS categories (
+                        id INTEGER PRIMARY KEY,
+                        name TEXT NOT NULL UNIQUE
+                    )
+                """)
+                # The categories the app used to hard-code come first, then any others already in use
+                self.executemany("INSERT OR IGNORE INTO categories (name) VALUES (?)",
+                                 [(name,) for name in DEFAULT_CATEGORIES])
+                self.execute("""
+                    INSERT OR IGNORE INTO categories (name)
+                    SELECT category FROM transactions GROUP BY category ORDER BY MIN(id)
+                """)
+
+                # Rebuild transactions with a category_id column, keeping every id
+                sequence = self.query_one("SELECT seq FROM sqlite_sequence WHERE name = 'transactions'")
+                self.execute("""
+                    CREATE TABLE transactions_by_id (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE NOT NULL,
+                        date TEXT NOT NULL,
+                        category_id INTEGER NOT NULL REFERENCES categories (id),
+                        amount REAL NOT NULL
+                    )
+                """)
+                self.execute("""
+                    INSERT INTO transactions_by_id (id, date, category_id, amount)
+                    SELECT t.id, t.date, c.id, t.amount
+                    FROM transactions t
+                    JOIN categories c ON c.name = t.category
+                """)
+                # Dropping the old table takes its indexes and summary triggers with it
+                self.execute("DROP TABLE transactions")
+                self.execute("ALTER TABLE transactions_by_id RENAME TO transactions")
+                # Ids that were handed out before, including archived ones, must never be reused
+                if sequence is not None:
+                    self.execute("DELETE FROM sqlite_sequence WHERE name = 'transactions'")
+                    self.execute("""
+                        INSERT INTO sqlite_sequence (name, seq)
+                        VALUES ('transactions', MAX(?, (SELECT IFNULL(MAX(id), 0) FROM transactions)))
+                    """, (sequence[0],))
+
+                self.execute("DROP TABLE monthly_category_totals")
+                self.execute("""
+                    CREATE TABLE monthly_category_totals (
+                        month TEXT NOT NULL,
+                        category_id INTEGER NOT NULL,
+                        total REAL NOT NULL DEFAULT 0,
+                        count INTEGER NOT NULL DEFAULT 0,
+                        PRIMARY KEY (month, category_id)
+                    ) WITHOUT ROWID
+                """)
+                self.execute("""
+                    CREATE TRIGGER trg_transactions_totals_insert
+                    AFTER INSERT ON transactions
+                    BEGIN
+                        INSERT INTO monthly_category_totals (month, category_id, total, count)
+                        VALUES (substr(NEW.date, 1, 7), NEW.category_id, IFNULL(NEW.amount + 0, 0), 1)
+                        ON CONFLICT (month, category_id) DO UPDATE
+                        SET total = total + excluded.total, count = count + 1;
+                    END
+                """)
+                self.execute("""
+                    CREATE TRIGGER trg_transactions_totals_delete
+                    AFTER DELETE ON transactions
+                    BEGIN
+                        UPDATE monthly_category_totals
+                        SET total = total - IFNULL(OLD.amount + 0, 0), count = count - 1
+                        WHERE month = substr(OLD.date, 1, 7) AND category_id = OLD.category_id;
+                        DELETE FROM monthly_category_totals
+                        WHERE month = substr(OLD.date, 1, 7) AND category_id = OLD.category_id AND count <= 0;
+                    END
+                """)
+                self.execute("""
+                    CREATE TRIGGER trg_transactions_totals_update
+                    AFTER UPDATE OF date, category_id, amount ON transactions
+                    BEGIN
+                        UPDATE monthly_category_totals
+                        SET total = total - IFNULL(OLD.amount + 0, 0), count = count - 1
+                        WHERE month = substr(OLD.date, 1, 7) AND category_id = OLD.category_id;
+                        DELETE FROM monthly_category_totals
+                        WHERE month = substr(OLD.date, 1, 7) AND category_id = OLD.category_id AND count <= 0;
+                        INSERT INTO monthly_category_totals (month, category_id, total, count)
+                        VALUES (substr(NEW.date, 1, 7), NEW.category_id, IFNULL(NEW.amount + 0, 0), 1)
+                        ON CONFLICT (month, category_id) DO UPDATE
+                        SET total = total + excluded.total, count = count + 1;
+                    END
+                """)
+                self.execute("PRAGMA user_version = 4")
+
+            # Seed the summary from the existing history, then drop the pages the text categories used
+            self.rebuild_monthly_totals()
+            self.execute("VACUUM")
+
+        if version < 5:
+            # Version 5: an optional payee/memo per transaction; open() adds its search index
+            with self.transaction():
+                self.execute("ALTER TABLE transactions ADD COLUMN memo TEXT")
+                self.execute("PRAGMA user_version = 5")
+
+        if version < 6:
+            # Version 6: imported statement lines carry a hash of their contents, unique among the rows that have one
+            with self.transaction():
+                self.execute("ALTER TABLE transactions ADD COLUMN import_hash BLOB")
+                self.execute("""
+                    CREATE UNIQUE INDEX idx_transactions_import_hash ON transactions (import_hash)
+                    WHERE import_hash IS NOT NULL
+                """)
+                # Hashes of rows moved to archive files, so re-importing a closed year still skips them
+                self.execute("""
+                    CREATE TABLE archived_import_hashes (
+                        import_hash BLOB PRIMARY KEY
+                    ) WITHOUT ROWID
+                """)
+                self.execute("PRAGMA user_version = 6")
+
+        if version < 7:
+            # Version 7: a standing monthly spending limit per category
+            with self.transaction():
+                self.execute("""
+                    CREATE TABLE category_budgets (
+                        category_id INTEGER PRIMARY KEY REFERENCES categories (id),
+                        monthly_limit REAL NOT NULL
+                    )
+                """)
+                self.execute("PRAGMA user_version = 7")
+
+    def get_data_version(self):
+        # Changes whenever another connection commits to the main file, e.g. the entry service or another app
+        return self.query_one("PRAGMA data_version")[0]
+
+    # Transactions
+
+    def add_transaction(self, date, category, amount, memo=None):
+        # Insert one transaction through the bulk path and hand back the new row id
+        self.add_transactions([(date, category, amount, memo)])
+        return self.query_one("SELECT last_insert_rowid()")[0]
+
+    def add_transactions(self, transactions, batch_size=INSERT_BATCH_SIZE):
+        # Insert (date, category, amount) or (date, category, amount, memo) rows from any iterable inside one transaction.
+        # One prepared statement is reused and rows are bound in executemany chunks,
+        # so a bulk load costs one sync at commit instead of one per row.
+        # Returns the number of rows inserted.
+        rows = iter(transactions)
+        inserted = 0
+        with self.transaction():
+            while True:
+                chunk = [(row[0], row[1], row[2], normalize_memo(row[3]) if len(row) > 3 else None)
+                         for row in itertools.islice(rows, batch_size)]
+                if not chunk:
+                    break
+                # Intern any new category names first, so every row can look its id up by name
+                self.executemany("INSERT OR IGNORE INTO categories (name) VALUES (?)",
+                                 [(name,) for name in dict.fromkeys(row[1] for row in chunk)])
+                self.executemany("""
+                    INSERT INTO transactions (date, category_id, amount, memo)
+                    VALUES (?, (SELECT id FROM categories WHERE name = ?), ?, ?)
+                """, chunk)
+                inserted += len(chunk)
+        return inserted
+
+    def import_transactions(self, transactions, batch_size=INSERT_BATCH_SIZE):
+        # Insert (date, category, amount, memo, import_hash) rows inside one transaction, skipping
+        # every row whose hash is already stored, whether in the main file or an archived year.
+        # Each check is one probe of a unique index. Returns (rows inserted, rows skipped).
+        rows = iter(transactions)
+        inserted = skipped = 0
+        with self.transaction():
+            while True:
+                chunk = [(row[0], row[1], row[2], normalize_memo(row[3]), row[4])
+                         for row in itertools.islice(rows, batch_size)]
+                if not chunk:
+                    break
+                self.executemany("INSERT OR IGNORE INTO categories (name) VALUES (?)",
+                                 [(name,) for name in dict.fromkeys(row[1] for row in chunk)])
+                # rowcount only counts rows this statement inserted, not the ones its triggers write
+                added = self.executemany("""
+                    INSERT OR IGNORE INTO transactions (date, category_id, amount, memo, import_hash)
+                    SELECT ?1, (SELECT id FROM categories WHERE name = ?2), ?3, ?4, ?5
+                    WHERE NOT EXISTS (SELECT 1 FROM archived_import_hashes WHERE import_hash = ?5)
+                """, chunk).rowcount
+                inserted += added
+                skipped += len(chunk) - added
+        return inserted, skipped
+
+    def get_transaction(self, transaction_id):
+        # Fetch a single (id, date, category, amount, memo) row as stored.
+        # Archived rows keep their ids, so an id missing from the main file is looked for in the archives, newest first.
+        sql = """
+            SELECT t.id, t.date, c.name, t.amount, t.memo
+            FROM {schema}.transactions t
+            JOIN main.categories c ON c.id = t.category_id
+            WHERE t.id = ?
+        """
+        row = self.query_one(sql.format(schema='main'), (transaction_id,))
+        if row is not None:
+            return row
+        for year in reversed(self.archived_years()):
+            schema = self.attach_archive(year)
+            if schema is not None:
+                row = self.query_one(sql.format(schema=schema), (transaction_id,))
+                if row is not None:
+                    return row
+        return None
+
+    def get_transactions_between(self, start_date, end_date):
+        # Fetch transactions with start_date <= date < end_date (ISO strings), oldest first
+        return list(self.iter_transactions_between(start_date, end_date))
+
+    def iter_transaction_rows(self, after_id=0, include_archives=False):
+        # Stream every (id, date, category, amount) row with an id after after_id.
+        # Rows are in id order within each file; archived years come first, oldest year first.
+        sql = """
+            SELECT t.id, t.date, c.name, t.amount
+            FROM {schema}.transactions t
+            JOIN main.categories c ON c.id = t.category_id
+            WHERE t.id > ?
+            ORDER BY t.id
+        """
+        schemas = self.archive_schemas() if include_archives else ()
+        archived = itertools.chain.from_iterable(
+            self.iterate(sql.format(schema=schema), (after_id,)) for schema in schemas)
+        return itertools.chain(archived, self.iterate(sql.format(schema='main'), (after_id,)))
+
+    def iter_transactions_between(self, start_date=None, end_date=None):
+        # Stream (date, category, amount, memo) rows in date order, optionally limited to a range.
+        # Archived years the range touches are attached and read one at a time, between stretches of the main file.
+        position = start_date
+        for year in self.archived_years(start_date, end_date):
+            year_start, year_end = f"{year:04d}-01-01", f"{year + 1:04d}-01-01"
+            if position is None or position < year_start:
+                for row_date, _, category, amount, memo in self.iter_file_transactions('main', position, year_start):
+                    yield row_date, category, amount, memo
+            # Rows added to the year after it was archived are still in the main file.
+            # Read them up front so nothing else is running when the archive is attached.
+            segment = (max(position, year_start) if position else year_start,
+                       min(end_date, year_end) if end_date else year_end)
+            late_rows = list(self.iter_file_transactions('main', *segment))
+            schema = self.attach_archive(year)
+            archived = self.iter_file_transactions(schema, *segment) if schema is not None else []
+            for row_date, _, category, amount, memo in heapq.merge(late_rows, archived):
+                yield row_date, category, amount, memo
+            position = year_end
+        if position is None or end_date is None or position < end_date:
+            for row_date, _, category, amount, memo in self.iter_file_transactions('main', position, end_date):
+                yield row_date, category, amount, memo
+
+    def iter_file_transactions(self, schema, start_date=None, end_date=None):
+        # Stream (date, id, category, amount, memo) rows of one attached file in date order
+        conditions, params = [], []
+        if start_date is not None:
+            conditions.append("t.date >= ?")
+            params.append(start_date)
+        if end_date is not None:
+            conditions.append("t.date < ?")
+            params.append(end_date)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self.iterate(f"""
+            SELECT t.date, t.id, c.name, t.amount, t.memo
+            FROM {schema}.transactions t
+            JOIN main.categories c ON c.id = t.category_id
+            {where}
+            ORDER BY t.date, t.id
+        """, params)
+
+    def fetch_transactions_page(self, sort_column='date', descending=True, category=None, last_row=None,
+                                limit=200):
+        # One page of (id, date, category, amount, memo) rows after last_row in the given order, archived years included.
+        # Keyset pagination on (sort key, id) means deep pages never OFFSET over earlier rows.
+        if sort_column not in TRANSACTION_SORT_COLUMNS:
+            raise ValueError(f"Cannot sort transactions by {sort_column!r}")
+        direction = "DESC" if descending else "ASC"
+        sort_keys = TRANSACTION_SORT_KEYS[sort_column] + [(0, 't.id')]
+        conditions, params = [], []
+        if category is not None:
+            conditions.append("t.category_id = (SELECT id FROM main.categories WHERE name = ?)")
+            params.append(category)
+        if last_row is not None:
+            comparison = "<" if descending else ">"
+            conditions.append(f"({', '.join(key for _, key in sort_keys)}) {comparison} "
+                              f"({', '.join('?' for _ in sort_keys)})")
+            params.extend(last_row[index] for index, _ in sort_keys)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        params.append(limit)
+        sql = f"""
+            SELECT t.id, t.date, c.name, t.amount, t.memo
+            FROM {{schema}}.transactions t
+            JOIN main.categories c ON c.id = t.category_id
+            {where}
+            ORDER BY {', '.join(f'{key} {direction}' for _, key in sort_keys)}
+            LIMIT ?
+        """
+        rows = self.query(sql.format(schema='main'), params)
+        # Ids are unique across the files, so the same keyset picks up each archive where the last page left it.
+        # Merging every file's next `limit` rows and keeping the first `limit` gives the page.
+        years = self.archived_years()
+        if sort_column == 'date':
+            # A year's archive only holds that year's dates: skip the years before last_row,
+            # and the years a full page from the main file already comes before
+            first_year, last_year = 0, 9999
+            bounds = [int(last_row[1][:4]) if last_row is not None else None,
+                      int(rows[-1][1][:4]) if len(rows) == limit else None]
+            if not descending:
+                bounds.reverse()
+            if bounds[0] is not None:
+                last_year = bounds[0]
+            if bounds[1] is not None:
+                first_year = bounds[1]
+            years = [year for year in years if first_year <= year <= last_year]
+        for year in years:
+            schema = self.attach_archive(year)
+            if schema is not None:
+                rows.extend(self.query(sql.format(schema=schema), params))
+        if years:
+            rows.sort(key=lambda row: tuple(row[index] for index, _ in sort_keys), reverse=descending)
+        return rows[:limit]
+
+    # Reports
+
+    def get_spending_by_category(self, start_date, end_date):
+        # Sum spending per category for start_date <= date < end_date (ISO strings), including archived years
+        spending = {}
+        for schema in itertools.chain(['main'], self.archive_schemas(start_date, end_date)):
+            for category, total in self.query(f"""
+                SELECT c.name, s.total
+                FROM (
+                    SELECT category_id, SUM(amount) AS total
+                    FROM {schema}.transactions
+                    WHERE date >= ? AND date < ?
+                    GROUP BY category_id
+                ) s
+                JOIN main.categories c ON c.id = s.category_id
+            """, (start_date, end_date)):
+                spending[category] = spending.get(category, 0) + total
+        return sorted(spending.items())
+
+    def get_monthly_totals(self, month):
+        # Per-category totals for a 'YYYY-MM' month from the summary table.
+        # An archived month adds its archive's totals to anything entered for it since.
+        schema = None
+        if self.query_one("SELECT 1 FROM archived_months WHERE month = ?", (month,)):
+            schema = self.attach_archive(int(month[:4]))
+        if schema is None:
+            return self.query("""
+                SELECT c.name, m.total
+                FROM monthly_category_totals m
+                JOIN categories c ON c.id = m.category_id
+                WHERE m.month = ?
+                ORDER BY c.name
+            """, (month,))
+        return self.query(f"""
+            SELECT c.name, s.total
+            FROM (
+                SELECT category_id, TOTAL(total) AS total
+                FROM (
+                    SELECT category_id, total FROM main.monthly_category_totals WHERE month = ?
+                    UNION ALL
+                    SELECT category_id, total FROM {schema}.monthly_category_totals WHERE month = ?
+                )
+                GROUP BY category_id
+            ) s
+            JOIN main.categories c ON c.id = s.category_id
+            ORDER BY c.name
+        """, (month, month))
+
+    def get_month_keys(self):
+        # The summary table's (month, category) primary key already gives the months in order.
+        # Archived months come from the catalog, so no archive is opened.
+        # Months whose dates could not be migrated to ISO are skipped.
+        month_keys = [row[0] for row in self.query(
+            "SELECT month FROM monthly_category_totals UNION SELECT month FROM archived_months ORDER BY month")]
+        return [month for month in month_keys if format_month_label(month) is not None]
+
+    def verify_monthly_totals(self):
+        # Count (month, category) rows where the summary disagrees with the transactions table
+        return self.query_one("""
+            WITH fresh AS (
+                SELECT substr(date, 1, 7) AS month, category_id, TOTAL(amount) AS total, COUNT(*) AS count
+                FROM transactions
+                GROUP BY month, category_id
+            )
+            SELECT COUNT(*) FROM (
+                SELECT f.month
+                FROM fresh f
+                LEFT JOIN monthly_category_totals m ON m.month = f.month AND m.category_id = f.category_id
+                WHERE m.month IS NULL OR m.count != f.count OR ABS(m.total - f.total) > 0.005
+                UNION ALL
+                SELECT m.month
+                FROM monthly_category_totals m
+                LEFT JOIN fresh f ON f.month = m.month AND f.category_id = m.category_id
+                WHERE f.month IS NULL
+            )
+        """)[0]
+
+    def rebuild_monthly_totals(self):
+        # Recompute the summary from scratch in one transaction
+        with self.transaction():
+            self.execute("DELETE FROM monthly_category_totals")
+            self.execute("""
+                INSERT INTO monthly_category_totals (month, category_id, total, count)
+                SELECT substr(date, 1, 7), category_id, TOTAL(amount), COUNT(*)
+                FROM transactions
+                GROUP BY substr(date, 1, 7), category_id
+            """)
+
+    # Memo search
+
+    def search_transactions(self, text, limit=SEARCH_RESULT_LIMIT):
+        # Transactions whose memo has every word of text, archived years included.
+        # With FTS5 words match as word prefixes, with the LIKE fallback as substrings.
+        # Returns (the newest `limit` matches as (id, date, category, amount, memo) rows, match count, total amount).
+        words = text.split()
+        if not words:
+            return [], 0, 0.0
+        rows, count, total = [], 0, 0.0
+        for schema in itertools.chain(self.archive_schemas(), ['main']):
+            condition, params = self.memo_condition(schema, words)
+            found, amount = self.query_one(
+                f"SELECT COUNT(*), TOTAL(t.amount) FROM {schema}.transactions t WHERE {condition}", params)
+            if not found:
+                continue
+            count += found
+            total += amount
+            rows.extend(self.query(f"""
+                SELECT t.id, t.date, c.name, t.amount, t.memo
+                FROM {schema}.transactions t
+                JOIN main.categories c ON c.id = t.category_id
+                WHERE {condition}
+                ORDER BY t.date DESC, t.id DESC
+                LIMIT ?
+            """, params + [limit]))
+        rows.sort(key=lambda row: (row[1], row[0]), reverse=True)
+        return rows[:limit], count, total
+
+    def memo_condition(self, schema, words):
+        # WHERE clause and parameters matching transactions t whose memo has every word
+        full_text_search = self.full_text_search if schema == 'main' else self.has_memo_index(schema)
+        if full_text_search:
+            # Each word is quoted so FTS5 syntax characters in it are taken literally
+            query = " ".join('"' + word.replace('"', '""') + '"*' for word in words)
+            return f"t.id IN (SELECT rowid FROM {schema}.transactions_fts WHERE transactions_fts MATCH ?)", [query]
+        patterns = ["%" + word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%" for word in words]
+        return " AND ".join(["t.memo LIKE ? ESCAPE '\\'"] * len(words)), patterns
+
+    def has_memo_index(self, schema):
+        return self.query_one(
+            f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = 'transactions_fts'") is not None
+
+    def create_memo_index(self, schema):
+        # Add an FTS5 index over memos, filled from the existing rows; run inside a transaction.
+        # Returns False, leaving searches to LIKE, if this SQLite was built without FTS5.
+        if self.has_memo_index(schema):
+            return True
+        try:
+            # External content: the index points back at transactions rather than keeping a copy of each memo
+            self.execute(f"""
+                CREATE VIRTUAL TABLE {schema}.transactions_fts
+                USING fts5(memo, content='transactions', content_rowid='id')
+            """)
+        except sqlite3.OperationalError as e:
+            if 'fts5' not in str(e):
+                raise
+            return False
+        if schema == 'main':
+            # Keep the index in step with every write; rows without a memo are never indexed
+            self.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_transactions_fts_insert
+                AFTER INSERT ON transactions
+                WHEN NEW.memo IS NOT NULL
+                BEGIN
+                    INSERT INTO transactions_fts (rowid, memo) VALUES (NEW.id, NEW.memo);
+                END
+            """)
+            self.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_transactions_fts_delete
+                AFTER DELETE ON transactions
+                WHEN OLD.memo IS NOT NULL
+                BEGIN
+                    INSERT INTO transactions_fts (transactions_fts, rowid, memo) VALUES ('delete', OLD.id, OLD.memo);
+                END
+            """)
+            self.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_transactions_fts_update
+                AFTER UPDATE OF memo ON transactions
+                BEGIN
+                    INSERT INTO transactions_fts (transactions_fts, rowid, memo)
+                    SELECT 'delete', OLD.id, OLD.memo WHERE OLD.memo IS NOT NULL;
+                    INSERT INTO transactions_fts (rowid, memo)
+                    SELECT NEW.id, NEW.memo WHERE NEW.memo IS NOT NULL;
+                END
+            """)
+        self.execute(f"INSERT INTO {schema}.transactions_fts (transactions_fts) VALUES ('rebuild')")
+        return True
+
+    # Categories
+
+    def get_categories(self):
+        # (id, name) for every category in the order they were added
+        return self.query("SELECT id, name FROM categories ORDER BY id")
+
+    def add_category(self, name):
+        # Add a category and return its id
+        name = self.check_category_name(name)
+        try:
+            return self.execute("INSERT INTO categories (name) VALUES (?)", (name,)).lastrowid
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Category {name} already exists")
+
+    def rename_category(self, category_id, name):
+        # Every transaction follows the rename, since rows only hold the id
+        name = self.check_category_name(name)
+        try:
+            renamed = self.execute("UPDATE categories SET name = ? WHERE id = ?", (name, category_id)).rowcount
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Category {name} already exists")
+        if not renamed:
+            raise ValueError(f"No category with id {category_id}")
+
+    def delete_category(self, category_id):
+        # Only unused categories can go; archived years count as uses.
+        # Archives can't be attached inside a transaction, so they are checked first; the main file is
+        # checked under the write lock, so nothing can start using the category before it is deleted.
+        for schema in self.archive_schemas():
+            if self.query_one(f"SELECT 1 FROM {schema}.transactions WHERE category_id = ? LIMIT 1",
+                              (category_id,)) is not None:
+                raise ValueError("Category is still used by transactions")
+        with self.transaction():
+            if self.query_one("SELECT 1 FROM transactions WHERE category_id = ? LIMIT 1", (category_id,)) is not None:
+                raise ValueError("Category is still used by transactions")
+            self.execute("DELETE FROM category_budgets WHERE category_id = ?", (category_id,))
+            self.execute("DELETE FROM categories WHERE id = ?", (category_id,))
+
+    def get_budgets(self):
+        # {category name: monthly limit} for every category with a budget
+        return dict(self.query("""
+            SELECT c.name, b.monthly_limit
+            FROM category_budgets b
+            JOIN categories c ON c.id = b.category_id
+            ORDER BY c.name
+        """))
+
+    def set_budget(self, category_id, monthly_limit):
+        # Set a category's monthly limit, or remove it with None; returns the limit as stored
+        if monthly_limit is None:
+            self.execute("DELETE FROM category_budgets WHERE category_id = ?", (category_id,))
+            return None
+        try:
+            monthly_limit = float(monthly_limit)
+        except (TypeError, ValueError):
+            raise ValueError(f"Budget must be a number, got {monthly_limit!r}")
+        if monthly_limit < 0:
+            raise ValueError("Budget can't be negative")
+        if self.query_one("SELECT 1 FROM categories WHERE id = ?", (category_id,)) is None:
+            raise ValueError(f"No category with id {category_id}")
+        self.execute("""
+            INSERT INTO category_budgets (category_id, monthly_limit) VALUES (?, ?)
+            ON CONFLICT (category_id) DO UPDATE SET monthly_limit = excluded.monthly_limit
+        """, (category_id, monthly_limit))
+        return monthly_limit
+
+    def check_category_name(self, name):
+        name = str(name).strip()
+        if not name:
+            raise ValueError("Category name can't be empty")
+        return name
+
+    # Archives
+
+    def archive_path(self, year):
+        # The archive file for a year, next to the main database
+        directory, name = os.path.split(os.path.abspath(self.path))
+        stem, ext = os.path.splitext(name)
+        return os.path.join(directory, ARCHIVE_FILE_FORMAT.format(stem=stem, year=year, ext=ext or '.db'))
+
+    def get_archives(self):
+        # (year, file name, rows, first date, last date, total) for every archived year, oldest first
+        return self.query("SELECT year, path, row_count, first_date, last_date, total FROM archives ORDER BY year")
+
+    def archived_years(self, start_date=None, end_date=None):
+        # Archived years overlapping start_date <= date < end_date (ISO strings), oldest first
+        first_year = int(start_date[:4]) if start_date else 0
+        last_year = 9999
+        if end_date:
+            last_year = int(end_date[:4]) - (1 if end_date[5:10] == '01-01' else 0)
+        return [row[0] for row in self.query(
+            "SELECT year FROM archives WHERE year BETWEEN ? AND ? ORDER BY year", (first_year, last_year))]
+
+    def archive_schemas(self, start_date=None, end_date=None):
+        # Attach the archives overlapping the range one at a time, yielding each schema name as it is reached
+        for year in self.archived_years(start_date, end_date):
+            schema = self.attach_archive(year)
+            if schema is not None:
+                yield schema
+
+    def attach_archive(self, year, create=False):
+        # Attach a year's archive unless it already is and return its schema name.
+        # A missing file is reported and skipped (None) unless create is set.
+        schema = f"archive_{int(year)}"
+        if schema in self.attached_archives:
+            self.attached_archives.move_to_end(schema)
+            return schema
+        path = self.archive_path(year)
+        if not create and not os.path.exists(path):
+            print(f"Archive for {year} is missing: {path}")
+            return None
+        # Make room by detaching the least recently used archive
+        while len(self.attached_archives) >= MAX_ATTACHED_ARCHIVES:
+            oldest, _ = self.attached_archives.popitem(last=False)
+            self.execute(f"DETACH DATABASE {oldest}")
+        self.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+        self.attached_archives[schema] = year
+        self.upgrade_archive(schema)
+        return schema
+
+    def upgrade_archive(self, schema):
+        # Bring an attached archive up to ARCHIVE_SCHEMA_VERSION; a brand new file just gets its tables
+        if self.query_one(f"PRAGMA {schema}.user_version")[0] >= ARCHIVE_SCHEMA_VERSION:
+            return
+        with self.transaction():
+            columns = [row[1] for row in self.query(f"PRAGMA {schema}.table_info(transactions)")]
+            if not columns:
+                self.create_archive_tables(schema)
+            elif 'category' in columns:
+                # Archived before categories had ids: intern its names and rewrite its rows
+                self.execute(f"""
+                    INSERT OR IGNORE INTO main.categories (name)
+                    SELECT category FROM {schema}.transactions GROUP BY category ORDER BY MIN(id)
+                """)
+                self.execute(f"DROP INDEX IF EXISTS {schema}.idx_transactions_date")
+                self.execute(f"DROP TABLE IF EXISTS {schema}.monthly_category_totals")
+                self.execute(f"ALTER TABLE {schema}.transactions RENAME TO transactions_by_name")
+                self.create_archive_tables(schema)
+                self.execute(f"""
+                    INSERT INTO {schema}.transactions (id, date, category_id, amount)
+                    SELECT t.id, t.date, c.id, t.amount
+                    FROM {schema}.transactions_by_name t
+                    JOIN main.categories c ON c.name = t.category
+                """)
+                self.execute(f"DROP TABLE {schema}.transactions_by_name")
+                self.rebuild_archive_totals(schema)
+            else:
+                # Archived before transactions had memos or import hashes
+                if 'memo' not in columns:
+                    self.execute(f"ALTER TABLE {schema}.transactions ADD COLUMN memo TEXT")
+                if 'import_hash' not in columns:
+                    self.execute(f"ALTER TABLE {schema}.transactions ADD COLUMN import_hash BLOB")
+            self.create_memo_index(schema)
+            self.execute(f"PRAGMA {schema}.user_version = {ARCHIVE_SCHEMA_VERSION}")
+
+    def create_archive_tables(self, schema):
+        self.execute(f"""
+            CREATE TABLE IF NOT EXISTS {schema}.transactions (
+                id INTEGER PRIMARY KEY,
+                date TEXT NOT NULL,
+                category_id INTEGER NOT NULL,
+                amount REAL NOT NULL,
+                memo TEXT,
+                import_hash BLOB
+            )
+        """)
+        self.execute(f"CREATE INDEX IF NOT EXISTS {schema}.idx_transactions_date ON transactions (date)")
+        self.execute(f"""
+            CREATE TABLE IF NOT EXISTS {schema}.monthly_category_totals (
+                month TEXT NOT NULL,
+                category_id INTEGER NOT NULL,
+                total REAL NOT NULL DEFAULT 0,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (month, category_id)
+            ) WITHOUT ROWID
+        """)
+
+    def rebuild_archive_totals(self, schema):
+        # Recompute an archive's own summary from its rows; run inside a transaction
+        self.execute(f"DELETE FROM {schema}.monthly_category_totals")
+        self.execute(f"""
+            INSERT INTO {schema}.monthly_category_totals (month, category_id, total, count)
+            SELECT substr(date, 1, 7), category_id, TOTAL(amount), COUNT(*)
+            FROM {schema}.transactions
+            GROUP BY substr(date, 1, 7), category_id
+        """)
+
+    def archive_year(self, year, vacuum=True):
+        # Move a closed year's transactions into its archive file, along with their monthly totals.
+        # Rows are copied and committed before they are removed from the main file, so an
+        # interrupted run can simply be repeated. Returns the number of rows moved.
+        year = int(year)
+        if year >= date.today().year:
+            raise ValueError(f"{year} is not a closed year")
+        start_date, end_date = f"{year:04d}-01-01", f"{year + 1:04d}-01-01"
+
+        # A new archive file gets its tables as it is attached
+        schema = self.attach_archive(year, create=True)
+
+        # Copy the year, keeping ids, and recompute the archive's own summary
+        with self.transaction():
+            self.execute(f"""
+                INSERT OR IGNORE INTO {schema}.transactions (id, date, category_id, amount, memo, import_hash)
+                SELECT id, date, category_id, amount, memo, import_hash
+                FROM main.transactions
+                WHERE date >= ? AND date < ?
+            """, (start_date, end_date))
+            self.rebuild_archive_totals(schema)
+            # Archives have no triggers; their memo index is rebuilt from the rows in one go
+            if self.has_memo_index(schema):
+                self.execute(f"INSERT INTO {schema}.transactions_fts (transactions_fts) VALUES ('rebuild')")
+
+        # Remove what was copied; the delete trigger takes the year out of the main summary
+        with self.transaction():
+            self.execute(f"""
+                INSERT OR IGNORE INTO archived_import_hashes (import_hash)
+                SELECT import_hash FROM {schema}.transactions
+                WHERE import_hash IS NOT NULL
+            """)
+            moved = self.execute(f"""
+                DELETE FROM main.transactions
+                WHERE date >= ? AND date < ? AND id IN (SELECT id FROM {schema}.transactions)
+            """, (start_date, end_date)).rowcount
+            row_count, first_date, last_date, total = self.query_one(
+                f"SELECT COUNT(*), MIN(date), MAX(date), TOTAL(amount) FROM {schema}.transactions")
+            self.execute("""
+                INSERT INTO archives (year, path, row_count, first_date, last_date, total)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (year) DO UPDATE
+                SET path = excluded.path, row_count = excluded.row_count, first_date = excluded.first_date,
+                    last_date = excluded.last_date, total = excluded.total
+            """, (year, os.path.basename(self.archive_path(year)), row_count, first_date, last_date, total))
+            self.execute(f"""
+                INSERT OR IGNORE INTO archived_months (month, year)
+                SELECT DISTINCT month, ? FROM {schema}.monthly_category_totals
+            """, (year,))
+
+        # Give the freed pages back so the main file actually shrinks
+        if vacuum and moved:
+            self.execute("VACUUM main")
+        return moved
+
+    # Accounting snapshots
+
+    def get_latest_accounting_details(self, account_names):
+        # Latest (checking, savings, saver, kiwi_saver, total) per account in one query.
+        # Accounts with no snapshot are left out.
+        account_names = list(account_names)
+        if not account_names:
+            return {}
+        # Each account's newest row is a single backwards seek on the (account_name, date, id) index
+        names = ", ".join("(?)" for _ in account_names)
+        rows = self.query(f"""
+            WITH names(account_name) AS (VALUES {names})
+            SELECT d.account_name, d.checking, d.savings, d.saver, d.kiwi_saver, d.total
+            FROM names
+            JOIN accounting_details d ON d.id = (
+                SELECT id
+                FROM accounting_details
+                WHERE account_name = names.account_name
+                ORDER BY date DESC, id DESC
+                LIMIT 1
+            )
+        """, account_names)
+        return {row[0]: row[1:] for row in rows}
+
+    def save_accounting_details(self, snapshots, snapshot_time=None):
+        # Write {account_name: {column: value}} balance snapshots in one transaction.
+        # Accounts whose balances match their latest snapshot are skipped; returns the number written.
+        if snapshot_time is None:
+            snapshot_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self.transaction():
+            latest = self.get_latest_accounting_details(snapshots)
+            rows = []
+            for account_name, balances in snapshots.items():
+                values = tuple(balances.get(column) for column in ACCOUNT_BALANCE_COLUMNS)
+                previous = latest.get(account_name)
+                if previous is not None and [normalize_balance(v) for v in values] == [normalize_balance(v) for v in previous]:
+                    continue
+                rows.append((account_name, snapshot_time) + values)
+            self.executemany("""
+                INSERT INTO accounting_details (account_name, date, checking, savings, saver, kiwi_saver, total)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+        return len(rows)
+
+    def get_balance_history(self, bucket='month'):
+        # Each account's total at the end of every day/week/month/year that has snapshots, oldest first.
+        # Downsampling happens in SQL, so years of snapshots come back as one row per account per bucket.
+        if bucket not in BALANCE_HISTORY_BUCKETS:
+            raise ValueError(f"Unknown balance history bucket {bucket!r}")
+        # SQLite takes the bare total column from the row holding MAX(date) in each group
+        return [row[:3] for row in self.query(f"""
+            SELECT account_name, {BALANCE_HISTORY_BUCKETS[bucket]} AS bucket, total, MAX(date)
+            FROM accounting_details
+            GROUP BY account_name, bucket
+            ORDER BY account_name, bucket
+        """)]
+
+    # Import and export
+
+    def import_excel(self, file_path):
+        # Import a category-by-month workbook into transactions in a single transaction.
+        # Returns (rows imported, seconds taken).
+        # openpyxl is only needed here, so it is imported on first use
+        from openpyxl import load_workbook
+
+        started = time.perf_counter()
+        # Read-only mode streams rows from the file instead of loading the whole sheet
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            imported = self.add_transactions(read_excel_transactions(workbook.active))
+        finally:
+            workbook.close()
+        return imported, time.perf_counter() - started
+
+    def import_bank_csv(self, file_path, mapping=None):
+        # Import a bank statement CSV, streaming it line by line, in a single transaction.
+        # mapping is a bank_csv mapping dict (default: bank_csv.DEFAULT_MAPPING).
+        # Lines imported before are skipped, so overlapping statements can be imported safely.
+        # Returns (rows inserted, rows skipped as duplicates, seconds taken).
+        from bank_csv import load_mapping, read_bank_csv
+
+        started = time.perf_counter()
+        mapping = mapping or load_mapping()
+        with open(file_path, newline='', encoding=mapping['encoding']) as statement:
+            inserted, skipped = self.import_transactions(read_bank_csv(statement, mapping))
+        return inserted, skipped, time.perf_counter() - started
+
+    def export_csv(self, output, start_date=None, end_date=None):
+        # Write transactions as date,category,amount,memo CSV to an open text file; returns the row count
+        writer = csv.writer(output)
+        writer.writerow(["date", "category", "amount", "memo"])
+        exported = 0
+        for row in self.iter_transactions_between(start_date, end_date):
+            writer.writerow(row)
+            exported += 1
+        return exported
@@ -0,0 +1,139 @@
+# Runs ledger calls on worker threads so the Qt event loop never waits on SQLite.
+# Each worker thread opens its own Ledger connection. Results come back to the GUI
+# thread through signals, and a request submitted under a key supersedes any
+# earlier request with the same key that hasn't delivered its result yet.
+import threading
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from ledger import Ledger
+
+
+class QueryRequest:
+    def __init__(self, key, function, args, on_result, on_error):
+        self.key = key
+        self.function = function
+        self.args = args
+        self.on_result = on_result
+        self.on_error = on_error
+        self.cancelled = False
+        self.started = False
+        self.worker = None
+
+
+class QueryWorker(QRunnable):
+    def __init__(self, executor, request):
+        super().__init__()
+        self.executor = executor
+        self.request = request
+
+    def run(self):
+        # The pool deletes this runnable once run() returns, so from here on cancel() must not touch it
+        self.request.started = True
+        # Skip requests that were superseded while they sat in the queue
+        if self.request.cancelled:
+            return
+        try:
+            result = self.request.function(self.executor.thread_ledger(), *self.request.args)
+        except Exception as e:
+            self.executor.request_failed.emit(self.request, e)
+        else:
+            self.executor.request_finished.emit(self.request, result)
+
+
+class QueryExecutor(QObject):
+    # Emitted from worker threads; delivered on the GUI thread because the executor lives there
+    request_finished = pyqtSignal(object, object)
+    request_failed = pyqtSignal(object, object)
+
+    def __init__(self, db_path, max_readers=4, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        # Worker thread id -> its connection. Not threading.local: Qt's pool threads aren't Python
+        # threads, so thread-local values don't survive from one request to the next.
+        self.ledgers = {}
+        self.ledgers_lock = threading.Lock()
+        self.pending = {}  # key -> latest QueryRequest
+
+        # Reads run in parallel; writes go through a single thread so they commit in submission order
+        self.read_pool = QThreadPool(self)
+        self.read_pool.setMaxThreadCount(max_readers)
+        self.write_pool = QThreadPool(self)
+        self.write_pool.setMaxThreadCount(1)
+        # Keep threads, and their open connections, alive for the life of the executor
+        for pool in (self.read_pool, self.write_pool):
+            pool.setExpiryTimeout(-1)
+
+        self.request_finished.connect(self.deliver_result)
+        self.request_failed.connect(self.deliver_error)
+
+    def thread_ledger(self):
+        # The calling worker thread's own connection, opened on first use
+        thread_id = threading.get_ident()
+        with self.ledgers_lock:
+            ledger = self.ledgers.get(thread_id)
+        if ledger is None:
+            ledger = Ledger(self.db_path, check_same_thread=False).open()
+            with self.ledgers_lock:
+                self.ledgers[thread_id] = ledger
+        return ledger
+
+    def submit(self, key, function, *args, on_result=None, on_error=None, write=False):
+        # Run function(ledger, *args) on a worker thread.
+        # A non-None key cancels the previous request with that key, so only the newest result is delivered.
+        if key is not None:
+            self.cancel(key)
+        request = QueryRequest(key, function, args, on_result, on_error)
+        request.worker = QueryWorker(self, request)
+        if key is not None:
+            self.pending[key] = request
+        (self.write_pool if write else self.read_pool).start(request.worker)
+        return request
+
+    def cancel(self, key):
+        request = self.pending.pop(key, None)
+        if request is None:
+            return
+        request.cancelled = True
+        # Drop it from the queue if no thread has picked it up yet. A worker that has started may
+        # already have been deleted by the pool, so only queued ones are touched.
+        if not request.started:
+            try:
+                self.read_pool.tryTake(request.worker)
+            except RuntimeError:
+                # It started and finished between the check and the call
+                pass
+
+    def deliver_result(self, request, result):
+        if not self.is_current(request):
+            return
+        if request.on_result is not None:
+            request.on_result(result)
+
+    def deliver_error(self, request, error):
+        if not self.is_current(request):
+            return
+        if request.on_error is not None:
+            request.on_error(error)
+        else:
+            print("Query failed: ", error)
+
+    def is_current(self, request):
+        # Finish bookkeeping for a delivered request; False if it was superseded meanwhile
+        if request.cancelled:
+            return False
+        if request.key is not None and self.pending.get(request.key) is request:
+            del self.pending[request.key]
+        return True
+
+    def shutdown(self):
+        # Cancel queued reads, wait for running work (including pending writes) to finish, then close every connection
+        for key in list(self.pending):
+            self.cancel(key)
+        self.read_pool.clear()
+        self.read_pool.waitForDone()
+        self.write_pool.waitForDone()
+        with self.ledgers_lock:
+            for ledger in self.ledgers.values():
+                ledger.close()
+            self.ledgers = {}
@@ -0,0 +1,106 @@
+# Process-wide query instrumentation shared by every Ledger connection.
+# Each statement's latency, bind count and row count is folded into a per-query
+# histogram. Statements slower than the threshold also have their EXPLAIN QUERY PLAN
+# written to a rotating slow-query log and kept in a short in-memory list.
+import bisect
+import logging
+import logging.handlers
+import os
+import re
+import threading
+import time
+from collections import deque
+
+# Statements at least this slow are logged with their query plan.
+# Override with BUDGET_TRACKER_SLOW_QUERY_MS.
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('BUDGET_TRACKER_SLOW_QUERY_MS', 100))
+SLOW_QUERY_LOG_PATH = os.environ.get('BUDGET_TRACKER_SLOW_QUERY_LOG', 'slow_queries.log')
+SLOW_QUERY_LOG_BYTES = 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 3
+# Upper bounds, in ms, of the latency histogram buckets; the last bucket is open ended
+LATENCY_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000)
+RECENT_SLOW_QUERIES = 50
+
+
+def normalize_sql(sql):
+    # Collapse whitespace so the same statement always lands in the same bucket
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def latency_bucket_labels():
+    labels = [f"<{bound} ms" for bound in LATENCY_BUCKETS_MS]
+    return labels + [f">={LATENCY_BUCKETS_MS[-1]} ms"]
+
+
+class QueryStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queries = {}  # normalized sql -> per-query totals
+        self.recent_slow = deque(maxlen=RECENT_SLOW_QUERIES)
+        self.slow_log = None
+
+    def record(self, sql, binds, seconds, rows, error=None):
+        # Fold one execution into the statement's totals
+        sql = normalize_sql(sql)
+        elapsed_ms = seconds * 1000
+        with self.lock:
+            totals = self.queries.get(sql)
+            if totals is None:
+                totals = self.queries[sql] = {
+                    'sql': sql, 'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0, 'binds': 0,
+                    'errors': 0, 'histogram': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                }
+            totals['calls'] += 1
+            totals['total_ms'] += elapsed_ms
+            totals['max_ms'] = max(totals['max_ms'], elapsed_ms)
+            totals['rows'] += rows
+            totals['binds'] += binds
+            totals['histogram'][bisect.bisect_right(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+            if error is not None:
+                totals['errors'] += 1
+
+    def is_slow(self, seconds):
+        return seconds * 1000 >= SLOW_QUERY_THRESHOLD_MS
+
+    def record_slow(self, sql, binds, seconds, rows, plan):
+        # Keep the slow statement for the Diagnostics tab and append it to the rotating log
+        entry = {
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'sql': normalize_sql(sql), 'binds': binds, 'ms': seconds * 1000, 'rows': rows, 'plan': plan,
+        }
+        with self.lock:
+            self.recent_slow.append(entry)
+        plan_text = "\n".join(f"    {line}" for line in plan) if plan else "    (no plan)"
+        self.get_slow_log().warning("%.1f ms, %d binds, %d rows: %s\n%s",
+                                    entry['ms'], binds, rows, entry['sql'], plan_text)
+
+    def get_slow_log(self):
+        # The log file is only created once something is actually slow
+        with self.lock:
+            if self.slow_log is None:
+                self.slow_log = logging.getLogger('budget_tracker.slow_queries')
+                self.slow_log.propagate = False
+                if not self.slow_log.handlers:
+                    handler = logging.handlers.RotatingFileHandler(
+                        SLOW_QUERY_LOG_PATH, maxBytes=SLOW_QUERY_LOG_BYTES, backupCount=SLOW_QUERY_LOG_BACKUPS)
+                    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+                    self.slow_log.addHandler(handler)
+            return self.slow_log
+
+    def snapshot(self):
+        # Copies of the per-query totals, slowest total time first, plus the recent slow statements
+        with self.lock:
+            queries = [dict(totals, histogram=list(totals['histogram'])) for totals in self.queries.values()]
+            recent_slow = list(self.recent_slow)
+        for totals in queries:
+            totals['avg_ms'] = totals['total_ms'] / totals['calls'] if totals['calls'] else 0.0
+        queries.sort(key=lambda totals: totals['total_ms'], reverse=True)
+        return queries, recent_slow
+
+    def reset(self):
+        with self.lock:
+            self.queries.clear()
+            self.recent_slow.clear()
+
+
+query_stats = QueryStats()
@@ -0,0 +1,104 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from ledger import Ledger, MAX_ATTACHED_ARCHIVES  # noqa: E402
+
+FIRST_YEAR = 2012
+# One more archived year than can be attached at once
+ARCHIVED_YEARS = list(range(FIRST_YEAR, FIRST_YEAR + MAX_ATTACHED_ARCHIVES + 1))
+LAST_YEAR = ARCHIVED_YEARS[-1] + 1
+CATEGORIES = ['Food', 'Rent', 'Pets', 'Books']
+MEMOS = ['coffee beans', 'weekly rent', 'cat food', 'paperback', None]
+
+
+def sample_rows(years, per_year=24, offset=0):
+    # A few rows a month with amounts in quarters, so sums don't depend on the order they are added in
+    rows = []
+    for year in years:
+        for index in range(per_year):
+            number = index + offset
+            rows.append((f"{year:04d}-{index % 12 + 1:02d}-{number % 28 + 1:02d}", CATEGORIES[number % 4],
+                         (number * 7 % 40) * 0.25 + 1, MEMOS[number % 5]))
+    return rows
+
+
+class ArchiveTest(unittest.TestCase):
+    def setUp(self):
+        # Both ledgers get the same rows; only one of them archives its closed years
+        self.directory = tempfile.TemporaryDirectory()
+        self.reference = self.open_ledger('reference')
+        self.ledger = self.open_ledger('archived')
+        self.add(sample_rows(ARCHIVED_YEARS + [LAST_YEAR]))
+        for year in ARCHIVED_YEARS:
+            self.assertEqual(self.ledger.archive_year(year, vacuum=False), 24)
+        # Rows added to the years after they were archived stay in the main file
+        self.add(sample_rows([ARCHIVED_YEARS[0], ARCHIVED_YEARS[-1]], per_year=5, offset=3))
+        self.assertGreater(len(self.ledger.archived_years()), MAX_ATTACHED_ARCHIVES)
+
+    def tearDown(self):
+        self.reference.close()
+        self.ledger.close()
+        self.directory.cleanup()
+
+    def open_ledger(self, name):
+        os.mkdir(os.path.join(self.directory.name, name))
+        return Ledger(os.path.join(self.directory.name, name, 'budget_tracker.db')).open()
+
+    def add(self, rows):
+        self.reference.add_transactions(rows)
+        self.ledger.add_transactions(rows)
+
+    def assertSameResults(self, method, *args):
+        self.assertEqual(method(self.ledger, *args), method(self.reference, *args), args)
+
+    def test_monthly_totals(self):
+        for year in ARCHIVED_YEARS + [LAST_YEAR]:
+            for month in range(1, 13):
+                self.assertSameResults(Ledger.get_monthly_totals, f"{year:04d}-{month:02d}")
+
+    def test_spending_by_category(self):
+        for start_date, end_date in [(f"{FIRST_YEAR}-01-01", f"{LAST_YEAR + 1}-01-01"),
+                                     (f"{FIRST_YEAR}-03-15", f"{FIRST_YEAR + 1}-02-10"),
+                                     (f"{LAST_YEAR - 1}-06-01", f"{LAST_YEAR}-06-01")]:
+            self.assertSameResults(Ledger.get_spending_by_category, start_date, end_date)
+
+    def test_export_csv(self):
+        def export(ledger, *dates):
+            output = io.StringIO()
+            ledger.export_csv(output, *dates)
+            return output.getvalue()
+        self.assertSameResults(export)
+        self.assertSameResults(export, f"{FIRST_YEAR}-06-10", f"{LAST_YEAR}-03-01")
+
+    def test_search(self):
+        for text in ('coffee', 'rent', 'cat fo', 'nothing here'):
+            self.assertSameResults(Ledger.search_transactions, text)
+        self.assertSameResults(Ledger.search_transactions, 'food', 10)
+
+    def test_rows_by_id(self):
+        last_id = self.reference.query_one("SELECT MAX(id) FROM transactions")[0]
+        for transaction_id in range(1, last_id + 2):
+            self.assertSameResults(Ledger.get_transaction, transaction_id)
+
+    def test_history_pages(self):
+        def pages(ledger, sort_column, descending, category=None, limit=50):
+            rows, last_row = [], None
+            while True:
+                page = ledger.fetch_transactions_page(sort_column, descending, category, last_row, limit)
+                rows.extend(page)
+                if len(page) < limit:
+                    return rows
+                last_row = page[-1]
+        for sort_column in ('date', 'category', 'amount'):
+            for descending in (True, False):
+                self.assertSameResults(pages, sort_column, descending)
+        self.assertSameResults(pages, 'date', True, 'Pets', 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from bank_csv import load_mapping, read_bank_csv  # noqa: E402
+from ledger import Ledger  # noqa: E402
+
+HEADER = "Date,Description,Amount"
+# Two statements that overlap on their middle lines
+JANUARY = ["05/01/2023,COUNTDOWN,-12.50", "06/01/2023,RENT,-400.00", "20/01/2023,COUNTDOWN,-7.25"]
+FEBRUARY = ["06/01/2023,RENT,-400.00", "20/01/2023,COUNTDOWN,-7.25", "03/02/2023,Z ENERGY,-80.00"]
+
+
+def read(lines, **overrides):
+    mapping = load_mapping()
+    mapping.update(overrides)
+    return list(read_bank_csv([HEADER] + lines, mapping))
+
+
+class ReadBankCsvTest(unittest.TestCase):
+    def test_debits_are_spending_and_credits_reduce_it(self):
+        rows = read(["05/01/2023,COUNTDOWN,-12.50", "06/01/2023,COUNTDOWN REFUND,4.00"],
+                    rules=[{'match': 'countdown', 'category': 'Food'}])
+        self.assertEqual([row[:4] for row in rows], [('2023-01-05', 'Food', 12.5, 'COUNTDOWN'),
+                                                     ('2023-01-06', 'Food', -4.0, 'COUNTDOWN REFUND')])
+
+    def test_debit_and_credit_columns(self):
+        mapping = load_mapping()
+        mapping.update(amount=None, debit='Debit', credit='Credit')
+        rows = list(read_bank_csv(["Date,Description,Debit,Credit", "05/01/2023,SHOP,12.50,",
+                                   "06/01/2023,REFUND,,4.00", "07/01/2023,SHOP,-3.00,"], mapping))
+        self.assertEqual([row[2] for row in rows], [12.5, -4.0, 3.0])
+        mapping['amount_sign'] = 'as_is'
+        rows = list(read_bank_csv(["Date,Description,Debit,Credit", "05/01/2023,SHOP,12.50,",
+                                   "06/01/2023,REFUND,,4.00"], mapping))
+        self.assertEqual([row[2] for row in rows], [-12.5, 4.0])
+
+    def test_identical_lines_are_both_kept(self):
+        rows = read(["05/01/2023,COFFEE,-4.50", "05/01/2023,COFFEE,-4.50"])
+        self.assertEqual(len(rows), 2)
+        self.assertNotEqual(rows[0][4], rows[1][4])
+        # The same lines in another file hash the same way
+        self.assertEqual([row[4] for row in rows], [row[4] for row in read(["05/01/2023,COFFEE,-4.50"] * 2)])
+
+    def test_one_date_format_per_file(self):
+        # Month-first dates that also read day-first are held back until a later line settles it
+        self.assertEqual([row[0] for row in read(["03/04/2024,A,-1", "03/15/2024,B,-1"])],
+                         ['2024-03-04', '2024-03-15'])
+        self.assertEqual([row[0] for row in read(["03/15/2024,A,-1", "03/04/2024,B,-1"])],
+                         ['2024-03-15', '2024-03-04'])
+        self.assertEqual([row[0] for row in read(["03/04/2024,A,-1", "15/03/2024,B,-1", "04/03/2024,C,-1"])],
+                         ['2024-04-03', '2024-03-15', '2024-03-04'])
+        # Lines in another format are skipped rather than read differently
+        self.assertEqual([row[0] for row in read(["2024-03-04,A,-1", "05/03/2024,B,-1"])], ['2024-03-04'])
+
+
+class ImportStatementTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.ledger = Ledger(os.path.join(self.directory.name, 'budget_tracker.db')).open()
+
+    def tearDown(self):
+        self.ledger.close()
+        self.directory.cleanup()
+
+    def import_statement(self, lines):
+        path = os.path.join(self.directory.name, 'statement.csv')
+        with open(path, 'w', newline='') as statement:
+            statement.write("\n".join([HEADER] + lines) + "\n")
+        inserted, skipped, _ = self.ledger.import_bank_csv(path)
+        return inserted, skipped
+
+    def test_overlapping_statements_skip_lines_already_imported(self):
+        self.assertEqual(self.import_statement(JANUARY), (3, 0))
+        self.assertEqual(self.import_statement(FEBRUARY), (1, 2))
+        self.assertEqual(self.import_statement(JANUARY + FEBRUARY[2:]), (0, 4))
+        self.assertEqual(self.ledger.query_one("SELECT COUNT(*) FROM transactions")[0], 4)
+
+    def test_archived_lines_are_not_imported_again(self):
+        self.import_statement(JANUARY)
+        self.assertEqual(self.ledger.archive_year(2023, vacuum=False), 3)
+        self.assertEqual(self.import_statement(FEBRUARY), (1, 2))
+        self.assertEqual(self.ledger.query_one("SELECT COUNT(*) FROM transactions")[0], 1)
+        self.assertEqual(self.ledger.get_spending_by_category('2023-01-01', '2024-01-01'),
+                         [('General', 499.75)])
+
+    def test_a_repeated_purchase_is_imported_twice_once(self):
+        self.assertEqual(self.import_statement(["05/01/2023,COFFEE,-4.50"] * 2), (2, 0))
+        self.assertEqual(self.import_statement(["05/01/2023,COFFEE,-4.50"] * 3), (1, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import http.client
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from budget_service import BudgetService, MAX_BODY_BYTES, is_busy  # noqa: E402
+from ledger import Ledger  # noqa: E402
+
+CLIENTS = 8
+POSTS_PER_CLIENT = 25
+
+
+class BudgetServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.directory.name, 'budget_tracker.db')
+        self.service = BudgetService(('127.0.0.1', 0), self.db_path, quiet=True)
+        self.thread = threading.Thread(target=self.service.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.service.shutdown()
+        self.service.server_close()
+        self.thread.join()
+        self.directory.cleanup()
+
+    def connect(self):
+        return http.client.HTTPConnection('127.0.0.1', self.service.server_address[1], timeout=10)
+
+    def request(self, connection, method, path, body=None):
+        connection.request(method, path, body=body)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    def post(self, connection, transaction):
+        return self.request(connection, 'POST', '/transactions', json.dumps(transaction))
+
+    def test_concurrent_posts_get_the_ids_of_their_rows(self):
+        results = []
+        lock = threading.Lock()
+
+        def client(number):
+            connection = self.connect()
+            for index in range(POSTS_PER_CLIENT):
+                transaction = {'date': '2024-06-%02d' % (index % 28 + 1), 'category': f"Client {number}",
+                               'amount': number * 1000 + index, 'memo': f"client {number} post {index}"}
+                status, reply = self.post(connection, transaction)
+                with lock:
+                    results.append((status, reply, transaction))
+            connection.close()
+
+        clients = [threading.Thread(target=client, args=(number,)) for number in range(CLIENTS)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+
+        self.assertEqual(len(results), CLIENTS * POSTS_PER_CLIENT)
+        self.assertEqual({status for status, _, _ in results}, {201})
+        ids = [reply['id'] for _, reply, _ in results]
+        self.assertEqual(len(set(ids)), len(ids))
+        with Ledger(self.db_path) as ledger:
+            for _, reply, transaction in results:
+                self.assertEqual(ledger.get_transaction(reply['id']),
+                                 (reply['id'], transaction['date'], transaction['category'],
+                                  float(transaction['amount']), transaction['memo']))
+            self.assertEqual(ledger.verify_monthly_totals(), 0)
+        stats = self.service.writer.get_stats()
+        self.assertEqual(stats['rows'], CLIENTS * POSTS_PER_CLIENT)
+        self.assertEqual(stats['errors'], 0)
+
+    def test_report_includes_posted_rows(self):
+        connection = self.connect()
+        self.post(connection, {'date': '2024-06-08', 'category': 'Food', 'amount': 12.5})
+        self.post(connection, {'date': '2024-06-09', 'category': 'Food', 'amount': 7.5})
+        status, report = self.request(connection, 'GET', '/report?month=2024-06')
+        self.assertEqual(status, 200)
+        self.assertEqual(report['categories'], [{'category': 'Food', 'total': 20.0}])
+        self.assertEqual(report['total'], 20.0)
+        connection.close()
+
+    def test_non_finite_amounts_are_rejected(self):
+        connection = self.connect()
+        for amount in ('NaN', 'Infinity', '-Infinity'):
+            body = '{"date": "2024-06-08", "category": "Food", "amount": %s}' % amount
+            status, reply = self.request(connection, 'POST', '/transactions', body)
+            self.assertEqual(status, 400, reply)
+        connection.close()
+        self.assertEqual(self.service.writer.get_stats()['rows'], 0)
+
+    def test_unread_bodies_close_the_connection(self):
+        connection = self.connect()
+        # A body posted to the wrong path must not be read as the next request
+        body = 'GET /health HTTP/1.1\r\n\r\n'
+        connection.request('POST', '/nowhere', body=body)
+        response = connection.getresponse()
+        response.read()
+        self.assertEqual(response.status, 404)
+        self.assertEqual(response.getheader('Connection'), 'close')
+        connection.close()
+
+        connection = self.connect()
+        # Only the header is needed: the body is refused before any of it is read
+        connection.putrequest('POST', '/transactions')
+        connection.putheader('Content-Length', str(MAX_BODY_BYTES + 1))
+        connection.endheaders(b'x')
+        response = connection.getresponse()
+        response.read()
+        self.assertEqual(response.status, 400)
+        self.assertEqual(response.getheader('Connection'), 'close')
+        connection.close()
+
+        # A chunked body has no Content-Length to read it by
+        connection = self.connect()
+        chunk = b'GET /health HTTP/1.1\r\n\r\n'
+        connection.putrequest('POST', '/transactions')
+        connection.putheader('Transfer-Encoding', 'chunked')
+        connection.endheaders(b'%x\r\n%s\r\n0\r\n\r\n' % (len(chunk), chunk))
+        response = connection.getresponse()
+        response.read()
+        self.assertEqual(response.status, 411)
+        self.assertEqual(response.getheader('Connection'), 'close')
+        connection.close()
+
+    def test_only_lock_errors_are_retryable(self):
+        holder = sqlite3.connect(self.db_path, isolation_level=None)
+        waiter = sqlite3.connect(self.db_path, isolation_level=None, timeout=0)
+        holder.execute("BEGIN IMMEDIATE")
+        with self.assertRaises(sqlite3.OperationalError) as locked:
+            waiter.execute("BEGIN IMMEDIATE")
+        holder.execute("ROLLBACK")
+        with self.assertRaises(sqlite3.OperationalError) as missing:
+            waiter.execute("SELECT * FROM no_such_table")
+        holder.close()
+        waiter.close()
+        self.assertTrue(is_busy(locked.exception))
+        self.assertFalse(is_busy(missing.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from ledger import Ledger, DEFAULT_CATEGORIES, SCHEMA_VERSION  # noqa: E402
+
+# A database as the original app wrote it: category names on every row, 'dd-MMM-yy' dates
+LEGACY_ROWS = [
+    (1, '05-Jan-23', 'Food', 12.5),
+    (2, '17-Jan-23', 'Rent', 400),
+    (3, '02-Feb-23', 'Food', 7.25),
+    (4, '03-Feb-23', 'Pets', 30),
+    (5, '20-Feb-23', 'Pets', 15),
+    (6, '21-Feb-23', 'Food', 99),
+]
+
+
+def create_legacy_database(path):
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE NOT NULL,
+            date TEXT NOT NULL,
+            category TEXT NOT NULL,
+            amount REAL NOT NULL
+        )
+    """)
+    conn.executemany("INSERT INTO transactions (id, date, category, amount) VALUES (?, ?, ?, ?)", LEGACY_ROWS)
+    # The newest row was deleted, so the sequence is ahead of the highest id left
+    conn.execute("DELETE FROM transactions WHERE id = 6")
+    conn.commit()
+    conn.close()
+
+
+class CategoryMigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'budget_tracker.db')
+        create_legacy_database(self.path)
+        self.ledger = Ledger(self.path).open()
+
+    def tearDown(self):
+        self.ledger.close()
+        self.directory.cleanup()
+
+    def test_schema_is_current(self):
+        self.assertEqual(self.ledger.query_one("PRAGMA user_version")[0], SCHEMA_VERSION)
+
+    def test_rows_keep_their_ids_and_categories(self):
+        for transaction_id, _, category, amount in LEGACY_ROWS[:5]:
+            row = self.ledger.get_transaction(transaction_id)
+            self.assertEqual((row[0], row[2], row[3]), (transaction_id, category, amount))
+        self.assertEqual(self.ledger.get_transaction(1)[1], '2023-01-05')
+        self.assertIsNone(self.ledger.get_transaction(6))
+
+    def test_categories_keep_the_default_order_then_first_use(self):
+        names = [name for _, name in self.ledger.get_categories()]
+        self.assertEqual(names, DEFAULT_CATEGORIES + ['Pets'])
+
+    def test_deleted_ids_are_not_reused(self):
+        self.assertEqual(self.ledger.add_transaction('2023-03-01', 'Food', 1), 7)
+
+    def test_monthly_totals_are_rebuilt(self):
+        self.assertEqual(self.ledger.get_monthly_totals('2023-01'), [('Food', 12.5), ('Rent', 400.0)])
+        self.assertEqual(self.ledger.get_monthly_totals('2023-02'), [('Food', 7.25), ('Pets', 45.0)])
+        self.assertEqual(self.ledger.verify_monthly_totals(), 0)
+
+    def test_totals_follow_later_changes(self):
+        self.ledger.add_transaction('2023-02-25', 'Pets', 5)
+        self.ledger.execute("DELETE FROM transactions WHERE id = 3")
+        self.assertEqual(self.ledger.get_monthly_totals('2023-02'), [('Pets', 50.0)])
+        self.assertEqual(self.ledger.verify_monthly_totals(), 0)
+
+
+class DeleteCategoryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.ledger = Ledger(os.path.join(self.directory.name, 'budget_tracker.db')).open()
+
+    def tearDown(self):
+        self.ledger.close()
+        self.directory.cleanup()
+
+    def test_category_in_use_is_kept(self):
+        category_id = self.ledger.add_category('Pets')
+        self.ledger.add_transaction('2023-02-03', 'Pets', 30)
+        with self.assertRaises(ValueError):
+            self.ledger.delete_category(category_id)
+        self.assertIn((category_id, 'Pets'), self.ledger.get_categories())
+        self.assertFalse(self.ledger.conn.in_transaction)
+
+    def test_unused_category_goes_with_its_budget(self):
+        category_id = self.ledger.add_category('Pets')
+        self.ledger.set_budget(category_id, 100)
+        self.ledger.delete_category(category_id)
+        self.assertNotIn('Pets', [name for _, name in self.ledger.get_categories()])
+        self.assertNotIn('Pets', self.ledger.get_budgets())
+
+
+class HistorySortTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.ledger = Ledger(os.path.join(self.directory.name, 'budget_tracker.db')).open()
+        # Categories added out of name order
+        for category in ('Zoo', 'Pets', 'Arts'):
+            self.ledger.add_category(category)
+        self.ledger.add_transactions([
+            ('2024-01-05', 'Zoo', 1), ('2024-01-06', 'Arts', 2), ('2024-01-04', 'Pets', 3),
+            ('2024-01-02', 'Arts', 4), ('2024-01-06', 'Pets', 5), ('2024-01-06', 'Arts', 6),
+        ])
+
+    def tearDown(self):
+        self.ledger.close()
+        self.directory.cleanup()
+
+    def pages(self, sort_column, descending, limit=2):
+        rows, last_row = [], None
+        while True:
+            page = self.ledger.fetch_transactions_page(sort_column, descending, last_row=last_row, limit=limit)
+            rows.extend(page)
+            if len(page) < limit:
+                return rows
+            last_row = page[-1]
+
+    def test_category_sorts_by_name_then_date(self):
+        rows = self.pages('category', False)
+        self.assertEqual([(row[2], row[1], row[0]) for row in rows],
+                         sorted((row[2], row[1], row[0]) for row in rows))
+        self.assertEqual([row[2] for row in rows], ['Arts'] * 3 + ['Pets'] * 2 + ['Zoo'])
+        self.assertEqual([row[0] for row in self.pages('category', True)], [row[0] for row in reversed(rows)])
+
+    def test_date_sort_breaks_ties_by_id(self):
+        self.assertEqual([row[0] for row in self.pages('date', True)], [6, 5, 2, 1, 3, 4])
+
+
+if __name__ == "__main__":
+    unittest.main()